@@ -1,14 +1,64 @@
-import sys
+import argparse
 
-from lang.interpreter import Interpreter
+from lang.program import compile_program
+from lang.stackless import STACK_LIMIT
+from lang.profiler import Profiler
+from lang.metrics import Metrics
+from lang.repl import Repl
+
+import lang.parallel as parallel
 
 
 if __name__ == "__main__":
 
-    if len(sys.argv) != 2:
-        print("Usage: python3 cou.py [file]")
+    args = argparse.ArgumentParser(description="Runs a cou program, or starts an interactive session")
+    args.add_argument("file", nargs="?", help="program to run")
+    args.add_argument("--stackless", action="store_true",
+                      help="keep frames on the heap, so recursion and expressions are not limited by the "
+                           "python stack (blocks still are, a few hundred deep)")
+    args.add_argument("--stack-limit", type=int, default=STACK_LIMIT,
+                      help=f"most calls a stackless run can nest (default {STACK_LIMIT})")
+    args.add_argument("--quicken", action="store_true",
+                      help="specialize operators, array accesses and calls to the values they see "
+                           "(ignored with --stackless, or if the program spawns tasks)")
+    args.add_argument("--workers", type=int,
+                      help="processes a 'par as' loop is split across (default: one per CPU)")
+    args.add_argument("--profile", metavar="OUTPUT",
+                      help="sample the call stack as the program runs, writing collapsed stacks to OUTPUT")
+    args.add_argument("--metrics", metavar="OUTPUT",
+                      help="count what the program does, writing the counts to OUTPUT in OpenMetrics format")
+
+    args = args.parse_args()
+
+    if args.workers is not None:
+        parallel.workers = args.workers
+
+    if args.file is None:
+        Repl().run()
 
     else:
-        with open(sys.argv[1]) as content:
-            intr = Interpreter(content.read())
-            intr.interpret()
+        metrics = Metrics() if args.metrics else None
+
+        with open(args.file) as content:
+            program = compile_program(content.read(), optimize=True, metrics=metrics)
+            execution = program.execution(stackless=args.stackless, stack_limit=args.stack_limit,
+                                          quicken=args.quicken, metrics=metrics)
+
+        profiler = Profiler(execution.interpreter) if args.profile else None
+
+        if profiler is not None:
+            profiler.start()
+
+        try:
+            execution.run()
+
+        finally:
+            if profiler is not None:
+                profiler.stop()
+
+                with open(args.profile, "w") as output:
+                    profiler.write(output)
+
+            if metrics is not None:
+                with open(args.metrics, "w") as output:
+                    metrics.write(output)
@@ -0,0 +1,465 @@
+from typing import Any, List, Tuple
+
+from lang.error import error
+
+# Alternative storage for cou arrays. The interpreter treats these the same
+# way as python lists: they support len() and integer indexing.
+
+# Arrays with at least this many elements start out sparse
+SPARSE_SIZE = 1 << 16
+
+# Fraction of a sparse array's elements that can be set before it is
+# stored densely instead
+DENSE_FRACTION = 0.1
+
+# Tags for the types of values a shared array can hold
+_NIL = 0
+_INT = 1
+_FLOAT = 2
+_BOOL = 3
+
+
+def allocate(size: int) -> Any:
+    """
+    Allocates an array of nothing, which is sparse if it is large
+    """
+
+    if size >= SPARSE_SIZE:
+        return SparseArray(size)
+
+    return [None] * size
+
+
+def shape_of(arr: list) -> Tuple[int, ...]:
+    """
+    Returns the shape of a rectangular array holding only numbers, booleans
+    and nothing, or None if the array cannot be stored as a flat buffer
+    """
+
+    if isinstance(arr, FlatArray):
+        for elem in arr.flat():
+            if not (elem is None or type(elem) in (int, float, bool)):
+                return None
+
+        return arr.shape
+
+    if arr and all(type(elem) == list for elem in arr):
+        inner = shape_of(arr[0])
+        if inner is None or any(shape_of(elem) != inner for elem in arr[1:]):
+            return None
+
+        return (len(arr),) + inner
+
+    for elem in arr:
+        if not (elem is None or type(elem) in (int, float, bool)):
+            return None
+
+    return (len(arr),)
+
+
+class SparseArray(object):
+    """
+    Large array that holds only the elements that have been set, in a
+    dictionary, and gives nothing for the rest. Once enough of its elements
+    are set it moves them into a list, which the interpreter then puts in
+    place of the sparse array, so that an array which fills up ends up
+    stored like any other.
+    """
+
+    def __init__(self, size: int):
+        """
+        Initializes an array of nothing with a size
+        """
+
+        self.size = size
+
+        # Elements that have been set, until the array becomes dense
+        self.cells = {}
+        self.dense = None
+
+        self._limit = int(size * DENSE_FRACTION)
+
+    def _position(self, index: int) -> int:
+        """
+        Returns the position of an index, counting back from the end for
+        negative indices as lists do
+        """
+
+        if index < 0:
+            index += self.size
+
+        if not 0 <= index < self.size:
+            raise IndexError("Array index out of range")
+
+        return index
+
+    def _densify(self) -> None:
+        """
+        Moves the elements that have been set into a list
+        """
+
+        dense = [None] * self.size
+        for pos, value in self.cells.items():
+            dense[pos] = value
+
+        self.dense = dense
+        self.cells = None
+
+    def tolist(self) -> list:
+        """
+        Returns the array as a list
+        """
+
+        return list(self)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __iter__(self):
+        if self.dense is not None:
+            return iter(self.dense)
+
+        get = self.cells.get
+        return (get(pos) for pos in range(self.size))
+
+    def __getitem__(self, index: Any) -> Any:
+        if self.dense is not None:
+            return self.dense[index]
+
+        if type(index) == slice:
+            get = self.cells.get
+            return [get(pos) for pos in range(*index.indices(self.size))]
+
+        return self.cells.get(self._position(index))
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        if self.dense is not None:
+            self.dense[index] = value
+            return
+
+        cells = self.cells
+
+        if type(index) == slice:
+            for pos, elem in zip(range(*index.indices(self.size)), value):
+                if elem is None:
+                    cells.pop(pos, None)
+                else:
+                    cells[pos] = elem
+
+        else:
+            cells[self._position(index)] = value
+
+        if len(cells) > self._limit:
+            self._densify()
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (SparseArray, FlatArray)):
+            other = other.tolist()
+
+        return self.tolist() == other
+
+    __hash__ = None
+
+
+class FlatArray(object):
+    """
+    Array with more than one dimension, whose cells are held in a single
+    list in row-major order. Indexing it with one index returns a view of a
+    row, while locate finds a cell from all of its indices at once.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], cells: list, offset: int = 0):
+        """
+        Initializes a view of a list of cells with a shape, starting at offset
+        """
+
+        self.shape = shape
+        self.ndim = len(shape)
+
+        self.cells = cells
+        self.offset = offset
+
+        # Number of cells between consecutive indices of each dimension
+        strides = [1]
+        for dim in reversed(shape[1:]):
+            strides.append(strides[-1] * dim)
+
+        self.strides = tuple(reversed(strides))
+
+    @classmethod
+    def create(cls, shape: Tuple[int, ...]) -> "FlatArray":
+        """
+        Allocates an array of nothing with a shape
+        """
+
+        size = 1
+        for dim in shape:
+            size *= dim
+
+        return cls(shape, [None] * size)
+
+    def locate(self, indices: List[Any]) -> int:
+        """
+        Returns the position in cells of the cell or row at some indices, or
+        None if any of them is not an integer in range or there are more of
+        them than dimensions
+        """
+
+        if self.ndim == 2 and len(indices) == 2:
+            # Cells of a table are checked all at once
+            i, j = indices
+            rows, cols = self.shape
+
+            if type(i) is int and type(j) is int and 0 <= i < rows and 0 <= j < cols:
+                return self.offset + i * cols + j
+
+        if len(indices) > self.ndim:
+            return None
+
+        pos = self.offset
+        shape = self.shape
+        strides = self.strides
+
+        for i, index in enumerate(indices):
+            if type(index) is not int or not 0 <= index < shape[i]:
+                if type(index) is not int or not -shape[i] <= index < 0:
+                    return None
+
+                # Negative indices count back from the end, as with lists
+                index += shape[i]
+
+            pos += index * strides[i]
+
+        return pos
+
+    def row(self, n: int, pos: int) -> "FlatArray":
+        """
+        Returns a view of the row at a position, below the first n dimensions
+        """
+
+        return FlatArray(self.shape[n:], self.cells, pos)
+
+    def flat(self) -> list:
+        """
+        Returns the cells of the array in row-major order
+        """
+
+        return self.cells[self.offset:self.offset + self.strides[0] * self.shape[0]]
+
+    def tolist(self) -> list:
+        """
+        Returns the array as nested lists
+        """
+
+        if self.ndim == 1:
+            return self.flat()
+
+        return [self[i].tolist() for i in range(self.shape[0])]
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: int) -> Any:
+        pos = self.locate((index,))
+        if pos is None:
+            raise IndexError("Array index out of range")
+
+        if self.ndim > 1:
+            return self.row(1, pos)
+
+        return self.cells[pos]
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        if self.ndim > 1:
+            error("Cannot replace a row of a multi-dimensional array")
+
+        pos = self.locate((index,))
+        if pos is None:
+            raise IndexError("Array index out of range")
+
+        self.cells[pos] = value
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (FlatArray, SparseArray)):
+            other = other.tolist()
+
+        return self.tolist() == other
+
+    __hash__ = None
+
+
+class SharedBuffer(object):
+    """
+    Block of shared memory holding a one byte type tag and an eight byte value
+    for each cell
+    """
+
+    def __init__(self, size: int):
+        """
+        Allocates shared memory for a number of cells
+        """
+
+        from multiprocessing import shared_memory
+
+        self.size = size
+        self.memory = shared_memory.SharedMemory(create=True, size=max(size * 9, 1))
+
+        buf = self.memory.buf
+        self.ints = buf[:size * 8].cast('q')
+        self.floats = buf[:size * 8].cast('d')
+        self.tags = buf[size * 8:size * 9]
+
+    def store(self, i: int, value: Any, pos: int = None) -> None:
+        """
+        Stores a value in a cell, reporting any error at pos
+        """
+
+        value_type = type(value)
+
+        if value is None:
+            self.tags[i] = _NIL
+
+        elif value_type == bool:
+            self.tags[i] = _BOOL
+            self.ints[i] = value
+
+        elif value_type == int:
+            self.tags[i] = _INT
+            self.ints[i] = value
+
+        elif value_type == float:
+            self.tags[i] = _FLOAT
+            self.floats[i] = value
+
+        else:
+            error("Only num, bool and nothing can be stored in a shared array", pos)
+
+    def load(self, i: int) -> Any:
+        """
+        Loads the value of a cell
+        """
+
+        tag = self.tags[i]
+
+        if tag == _INT:
+            return self.ints[i]
+
+        if tag == _FLOAT:
+            return self.floats[i]
+
+        if tag == _BOOL:
+            return bool(self.ints[i])
+
+        return None
+
+    def release(self) -> None:
+        """
+        Frees the shared memory
+        """
+
+        self.ints.release()
+        self.floats.release()
+        self.tags.release()
+
+        self.memory.close()
+        self.memory.unlink()
+
+
+class SharedArray(object):
+    """
+    Array stored in shared memory, so that processes can write to it in
+    place. Indexing an array with more than one dimension returns a view of
+    a row. Errors writing to the array are reported at pos, the position of
+    the loop it was shared for.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], buffer: SharedBuffer, offset: int = 0,
+                 pos: int = None):
+        """
+        Initializes a view of a shared buffer with a shape, starting at offset
+        """
+
+        self.shape = shape
+        self.buffer = buffer
+        self.offset = offset
+        self.pos = pos
+
+        self.stride = 1
+        for dim in shape[1:]:
+            self.stride *= dim
+
+    @classmethod
+    def create(cls, arr: list, shape: Tuple[int, ...], pos: int = None) -> "SharedArray":
+        """
+        Allocates a shared buffer for nested lists and copies them into it
+        """
+
+        size = 1
+        for dim in shape:
+            size *= dim
+
+        shared = cls(shape, SharedBuffer(size), pos=pos)
+
+        for i, value in enumerate(_flatten(arr, len(shape))):
+            shared.buffer.store(i, value, pos)
+
+        return shared
+
+    def _cell(self, index: int) -> int:
+        if index < 0:
+            index += self.shape[0]
+
+        if not 0 <= index < self.shape[0]:
+            raise IndexError("Array index out of range")
+
+        return self.offset + index * self.stride
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, index: int) -> Any:
+        if len(self.shape) > 1:
+            return SharedArray(self.shape[1:], self.buffer, self._cell(index), self.pos)
+
+        return self.buffer.load(self._cell(index))
+
+    def __setitem__(self, index: int, value: Any) -> None:
+        if len(self.shape) > 1:
+            error("Cannot replace a row of a shared array", self.pos)
+
+        self.buffer.store(self._cell(index), value, self.pos)
+
+    def copy_to(self, arr: list) -> None:
+        """
+        Copies the contents of the array back into nested lists, or a flat
+        array, in place
+        """
+
+        if isinstance(arr, FlatArray):
+            size = self.stride * self.shape[0]
+            load = self.buffer.load
+
+            arr.cells[arr.offset:arr.offset + size] = [load(self.offset + i) for i in range(size)]
+            return
+
+        if len(self.shape) > 1:
+            for i, row in enumerate(arr):
+                self[i].copy_to(row)
+            return
+
+        load = self.buffer.load
+        arr[:] = [load(self.offset + i) for i in range(self.shape[0])]
+
+
+def _flatten(arr: list, ndim: int) -> List[Any]:
+    """
+    Flattens nested lists, or a flat array, in row-major order
+    """
+
+    if isinstance(arr, FlatArray):
+        return arr.flat()
+
+    if ndim == 1:
+        return arr
+
+    return [elem for row in arr for elem in _flatten(row, ndim - 1)]
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Any, List
 from lang.tokenizer import Token
 from lang.symtab import Symbol
 import lang.token as tok
@@ -6,6 +6,31 @@ import lang.token as tok
 # Abstract syntax tree
 
 
+def walk(node: "AST"):
+    """
+    Yields a node and every node below it
+    """
+
+    # Nodes left to yield, the next one last, so that deep trees do not
+    # run out of python stack
+    stack = [node]
+
+    while stack:
+        node = stack.pop()
+        yield node
+
+        children = []
+
+        for child in vars(node).values():
+            if isinstance(child, AST):
+                children.append(child)
+
+            elif isinstance(child, list):
+                children.extend(elem for elem in child if isinstance(elem, AST))
+
+        stack.extend(reversed(children))
+
+
 class AST(object):
     """
     Superclass for AST nodes
@@ -25,7 +50,7 @@ class Number(AST):
 
     def __init__(self, token: Token):
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
 
     def name(self) -> str:
         return "number"
@@ -41,7 +66,7 @@ class Boolean(AST):
 
     def __init__(self, token: Token):
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
 
     def name(self) -> str:
         return "boolean"
@@ -57,7 +82,7 @@ class String(AST):
 
     def __init__(self, token: Token):
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
 
     def name(self) -> str:
         return "string"
@@ -73,7 +98,7 @@ class Nothing(AST):
 
     def __init__(self, token: Token):
         self.value = None
-        self.token = token
+        self.pos = token.pos
 
     def name(self) -> str:
         return "nothing"
@@ -83,29 +108,34 @@ class Nothing(AST):
 
 class ArrayInitialization(AST):
     """
-    Represents an array in the AST
+    Represents an array in the AST, with one size for each of its
+    dimensions
     """
 
-    def __init__(self, token: Token, size: AST):
-        self.token = token
-        self.size = size
+    def __init__(self, token: Token, sizes: List[AST]):
+        self.pos = token.pos
+        self.sizes = sizes
 
     def name(self) -> str:
         return "array_initialization"
 
     def __str__(self) -> str:
-        return f"arr {self.size}"
+        return f"arr {self.sizes}"
 
 
 class ArrayElement(AST):
     """
-    Represents an array element in the AST
+    Represents an array element in the AST, along with the level of the
+    frame its array lives in. A safe element has a single index that the
+    optimizer has proven to be in bounds.
     """
 
-    def __init__(self, token: Token, indices: List[AST]):
-        self.token = token
+    def __init__(self, token: Token, indices: List[AST], depth: int = None):
+        self.pos = token.pos
         self.arr_name = token.value
         self.indices = indices
+        self.depth = depth
+        self.safe = False
 
     def name(self) -> str:
         return "array_element"
@@ -119,7 +149,7 @@ class ArrayElementAssignment(AST):
     """
 
     def __init__(self, left: AST, token: Token, right: AST):
-        self.token = token
+        self.pos = token.pos
         self.left = left
         self.right = right
 
@@ -137,7 +167,7 @@ class UnaryOperator(AST):
 
     def __init__(self, token: Token, child: AST):
         self.value = token.type
-        self.token = token
+        self.pos = token.pos
         self.child = child
 
     def name(self) -> str:
@@ -155,7 +185,7 @@ class BinaryOperator(AST):
     def __init__(self, left: AST, token: Token, right: AST):
         self.left = left
         self.value = token.type
-        self.token = token
+        self.pos = token.pos
         self.right = right
 
     def name(self) -> str:
@@ -165,15 +195,33 @@ class BinaryOperator(AST):
         return f"{self.left} {self.value} {self.right}"
 
 
+class LogicalOperator(BinaryOperator):
+    """
+    Represents && or ||, whose right operand is only evaluated if the left
+    one does not decide the result
+    """
+
+    def __init__(self, left: AST, token: Token, right: AST):
+        super().__init__(left, token, right)
+
+        # Value of the left operand that decides the result
+        self.decides = token.type == tok.OR
+
+    def name(self) -> str:
+        return "logical_operator"
+
+
 class Variable(AST):
     """
-    Represents a variable in the AST
+    Represents a variable in the AST, along with the level of the frame it
+    lives in
     """
 
-    def __init__(self, token: Token, var_type: str):
+    def __init__(self, token: Token, var_type: str, depth: int = None):
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
         self.var_type = var_type
+        self.depth = depth
 
     def name(self) -> str:
         return "variable"
@@ -186,7 +234,7 @@ class VariableType(AST):
 
     def __init__(self, token: Token):
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
 
     def name(self) -> str:
         return "variable_type"
@@ -203,7 +251,7 @@ class AssignmentStatement(AST):
     def __init__(self, left: AST, token: Token, right: AST):
         self.left = left
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
         self.right = right
 
     def name(self) -> str:
@@ -218,8 +266,9 @@ class Empty(AST):
     Represents an empty statement in the AST
     """
 
-    def __init__(self):
+    def __init__(self, token: Token):
         self.value = None
+        self.pos = token.pos
 
     def name(self) -> str:
         return "empty"
@@ -236,8 +285,9 @@ class VariableDeclaration(AST):
     def __init__(self, variable: AST, variable_type: AST):
         self.variable = variable
         self.value = variable.value
-        self.token = variable.token
+        self.pos = variable.pos
         self.var_type = variable_type.value
+        self.depth = variable.depth
 
     def name(self) -> str:
         return "variable_declaration"
@@ -253,7 +303,7 @@ class Say(AST):
 
     def __init__(self, to_say: AST):
         self.value = to_say
-        self.token = to_say.token
+        self.pos = to_say.pos
 
     def name(self) -> str:
         return "say"
@@ -267,9 +317,10 @@ class Return(AST):
     Represents a return statement
     """
 
-    def __init__(self, statement: AST):
+    def __init__(self, token: Token, statement: AST):
         self.statement = statement
         self.value = statement.value
+        self.pos = token.pos
 
     def name(self) -> str:
         return "return"
@@ -283,13 +334,17 @@ class ProcessDeclaration(AST):
     Represents a process declaration
     """
 
-    def __init__(self, token: Token, type_def: AST, params: List[AST] = None):
-        self.token = token
+    def __init__(self, token: Token, type_def: AST, params: List[AST] = None,
+                 depth: int = None):
+        self.pos = token.pos
         self.value = token.value
 
         self.type_def = type_def.value
         self.params = params
 
+        # Level of the frames the process runs in
+        self.depth = depth
+
     def name(self) -> str:
         return "process_declaration"
 
@@ -299,14 +354,14 @@ class ProcessDeclaration(AST):
             param_fmt = str(self.params)
             param_fmt = param_fmt[1: len(param_fmt) - 1]
 
-        return f"proc {self.token.value}: {self.type_def}({param_fmt})"
+        return f"proc {self.value}: {self.type_def}({param_fmt})"
 
 
 class ProcessCall(AST):
 
     def __init__(self, token: Token, args: List[AST], proc_sym: Symbol):
         self.value = token.value
-        self.token = token
+        self.pos = token.pos
         self.args = args
         self.proc_sym = proc_sym
 
@@ -318,6 +373,82 @@ class ProcessCall(AST):
         return f"{self.value}({args_fmt[1 : len(args_fmt) - 1]})"
 
 
+class InlinedCall(AST):
+    """
+    Represents a process call whose body was copied into the caller, to run
+    in the caller's frame rather than a frame of its own
+    """
+
+    def __init__(self, call: AST, params: List[str], block: AST):
+        self.value = call.value
+        self.pos = call.pos
+        self.args = call.args
+        self.type_def = call.proc_sym.type_def
+
+        # Names the arguments are bound to in the caller's frame
+        self.params = params
+        self.block = block
+
+    def name(self) -> str:
+        return "inlined_call"
+
+    def __str__(self) -> str:
+        args_fmt = str(self.args)
+        return f"{self.value}({args_fmt[1 : len(args_fmt) - 1]})"
+
+
+class SharedExpression(AST):
+    """
+    Represents an expression whose value is also kept in a variable, for
+    copies of the expression that come after it to read
+    """
+
+    def __init__(self, expression: AST, name: str, depth: int):
+        self.pos = expression.pos
+        self.expression = expression
+
+        self.value = name
+        self.depth = depth
+
+    def name(self) -> str:
+        return "shared_expression"
+
+    def __str__(self) -> str:
+        return f"({self.value} := {self.expression})"
+
+
+class Spawn(AST):
+    """
+    Represents a process call started as a task
+    """
+
+    def __init__(self, token: Token, call: AST):
+        self.pos = token.pos
+        self.call = call
+
+    def name(self) -> str:
+        return "spawn"
+
+    def __str__(self) -> str:
+        return f"spawn {self.call}"
+
+
+class Await(AST):
+    """
+    Represents waiting for the result of a task
+    """
+
+    def __init__(self, token: Token, child: AST):
+        self.pos = token.pos
+        self.child = child
+
+    def name(self) -> str:
+        return "await"
+
+    def __str__(self) -> str:
+        return f"await {self.child}"
+
+
 class Process(AST):
     """
     Represents a process
@@ -325,7 +456,7 @@ class Process(AST):
 
     def __init__(self, declr: AST, block: AST):
         self.declr = declr
-        self.token = declr.token
+        self.pos = declr.pos
         self.value = declr.value
         self.block = block
 
@@ -344,7 +475,7 @@ class Process(AST):
 class Condition(AST):
 
     def __init__(self, condition: AST, block: AST):
-        self.token = condition.token
+        self.pos = condition.pos
         self.condition = condition
         self.block = block
 
@@ -362,6 +493,7 @@ class Conditions(AST):
 
     def __init__(self, conditions: List[AST]):
         self.conditions = conditions
+        self.pos = conditions[0].pos
 
     def name(self) -> str:
         return "conditions"
@@ -373,7 +505,7 @@ class Conditions(AST):
 class AsDeclaration(AST):
 
     def __init__(self, token: Token, counter: AST, condition: AST, after: AST):
-        self.token = token
+        self.pos = token.pos
         self.counter = counter
         self.condition = condition
         self.after = after
@@ -398,16 +530,55 @@ class As(AST):
     Represents an as loop
     """
 
-    def __init__(self, token: Token, declr: AST, block: AST):
-        self.token = token
+    def __init__(self, token: Token, declr: AST, block: AST, parallel: bool = False):
+        self.pos = token.pos
         self.declr = declr
         self.block = block
+        self.parallel = parallel
 
     def name(self) -> str:
         return "as"
 
     def __str__(self) -> str:
-        return f"as {self.declr} {self.block}"
+        prefix = 'par ' if self.parallel else ''
+        return f"{prefix}as {self.declr} {self.block}"
+
+
+class StrBuffer(AST):
+    """
+    Represents an as loop that builds up str variables by appending to them.
+    The variables hold buffers while the loop runs, and are joined back into
+    strings once it finishes.
+    """
+
+    def __init__(self, loop: AST, variables: List[AST]):
+        self.pos = loop.pos
+        self.loop = loop
+        self.variables = variables
+
+    def name(self) -> str:
+        return "str_buffer"
+
+    def __str__(self) -> str:
+        return str(self.loop)
+
+
+class StrAppend(AST):
+    """
+    Represents appending values, converted to strings, to a str variable
+    whose buffer is held by an enclosing StrBuffer
+    """
+
+    def __init__(self, pos: int, variable: AST, parts: List[AST]):
+        self.pos = pos
+        self.variable = variable
+        self.parts = parts
+
+    def name(self) -> str:
+        return "str_append"
+
+    def __str__(self) -> str:
+        return f"{self.variable.value} += {' + '.join(str(p) for p in self.parts)}"
 
 
 class Block(AST):
@@ -429,11 +600,17 @@ class Block(AST):
 
 class Program(AST):
     """
-    Represents a compound statement in the AST
+    Represents a compound statement in the AST, along with the sources its
+    positions are in, which are kept for as long as it is
     """
 
-    def __init__(self, statements: List[AST] = None):
+    def __init__(self, statements: List[AST] = None, sources: List[Any] = None,
+                 spawns: bool = False):
         self.statements = [] if not statements else statements
+        self.sources = [] if not sources else sources
+
+        # Whether any of its statements spawns a task
+        self.spawns = spawns
 
     def name(self) -> str:
         return "program"
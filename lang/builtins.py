@@ -0,0 +1,175 @@
+import sys
+import time
+import asyncio
+
+from typing import Any, List
+
+import lang.token as tok
+
+from lang.error import error
+from lang.tokenizer import Token
+from lang.ast import AST, Variable, VariableType, VariableDeclaration
+from lang.symtab import BuiltinSymbol, SymbolTable
+from lang.stream import Reader, File
+
+# Builtin processes. Each one is called with the position of the call, followed
+# by the values of its arguments.
+
+
+def _param(name: str, type_def: str) -> AST:
+    """
+    Builds the declaration of a parameter, as the parser would for a process
+    """
+
+    variable = Variable(Token(tok.ID, name, None), type_def)
+    return VariableDeclaration(variable, VariableType(Token(type_def, type_def, None)))
+
+
+def _check_delay(pos: int, seconds: Any) -> None:
+    if seconds < 0:
+        error("Cannot sleep for a negative number of seconds", pos)
+
+
+def _sleep(pos: int, seconds: Any) -> None:
+    _check_delay(pos, seconds)
+    time.sleep(seconds)
+
+
+async def _sleep_async(pos: int, seconds: Any) -> None:
+    _check_delay(pos, seconds)
+    await asyncio.sleep(seconds)
+
+
+# Reader over standard input, created on first use
+_stdin = None
+
+
+def _input() -> Reader:
+    global _stdin
+
+    if _stdin is None:
+        _stdin = Reader(sys.stdin.buffer)
+
+    return _stdin
+
+
+def _num(pos: int, text: str) -> Any:
+    """
+    Converts text to a num
+    """
+
+    try:
+        return int(text)
+    except ValueError:
+        pass
+
+    try:
+        return float(text)
+    except ValueError:
+        error(f"Cannot read '{text}' as a num", pos)
+
+
+def _nums(pos: int, text: str) -> List[Any]:
+    """
+    Converts whitespace separated text to nums
+    """
+
+    words = text.split()
+
+    try:
+        # Whole numbers are by far the most common, and map stays in C
+        return list(map(int, words))
+    except ValueError:
+        return [_num(pos, word) for word in words]
+
+
+def _has_line(pos: int) -> bool:
+    return not _input().at_end()
+
+
+def _read_line(pos: int) -> str:
+    line = _input().readline()
+
+    if line is None:
+        error("No input left to read", pos)
+
+    return line
+
+
+def _read_lines(pos: int) -> list:
+    return _input().readlines()
+
+
+def _read_nums(pos: int) -> list:
+    return _nums(pos, _input().read())
+
+
+def _parse_nums(pos: int, line: str) -> list:
+    return _nums(pos, line)
+
+
+def _size(pos: int, array: Any) -> int:
+    return len(array)
+
+
+def _open(pos: int, path: str) -> File:
+    try:
+        return File(path)
+    except OSError as err:
+        error(f"Cannot open '{path}': {err.strerror}", pos)
+
+
+def _reader(pos: int, file: File) -> Reader:
+    """
+    Returns the reader of a file that is still open
+    """
+
+    if file.closed:
+        error(f"File '{file.path}' has been closed", pos)
+
+    return file.reader
+
+
+def _at_end(pos: int, file: File) -> bool:
+    return _reader(pos, file).at_end()
+
+
+def _next_line(pos: int, file: File) -> str:
+    line = _reader(pos, file).readline()
+
+    if line is None:
+        error(f"No lines left to read in '{file.path}'", pos)
+
+    return line
+
+
+def _close(pos: int, file: File) -> None:
+    file.close()
+
+
+# Processes declared in the scope enclosing every program, which the program's
+# own declarations can hide
+builtins = [
+    BuiltinSymbol("sleep", tok.NIL, [_param("seconds", tok.NUM)], _sleep, _sleep_async),
+    BuiltinSymbol("size", tok.NUM, [_param("array", tok.ARR)], _size),
+
+    BuiltinSymbol("has_line", tok.BOOL, [], _has_line),
+    BuiltinSymbol("read_line", tok.STR, [], _read_line),
+    BuiltinSymbol("read_lines", tok.ARR, [], _read_lines),
+    BuiltinSymbol("read_nums", tok.ARR, [], _read_nums),
+    BuiltinSymbol("parse_nums", tok.ARR, [_param("line", tok.STR)], _parse_nums),
+
+    BuiltinSymbol("open", tok.FILE, [_param("path", tok.STR)], _open),
+    BuiltinSymbol("at_end", tok.BOOL, [_param("file", tok.FILE)], _at_end),
+    BuiltinSymbol("next_line", tok.STR, [_param("file", tok.FILE)], _next_line),
+    BuiltinSymbol("close", tok.NIL, [_param("file", tok.FILE)], _close),
+]
+
+
+def declare(symtab: SymbolTable) -> None:
+    """
+    Declares the builtin processes in a symbol table
+    """
+
+    for symbol in builtins:
+        symtab.declare_builtin(symbol.name, symbol)
@@ -29,30 +29,58 @@ class Record(object):
 
 class ActivationRecord(Record):
     """
-    Represents a frame on the call stack
+    Represents a frame on the call stack. Its level is the number of
+    processes it is nested in, counting the main frame as level 1, and its
+    context (the frame it is nested in) is set when it is pushed
     """
 
-    def __init__(self, name: str, sc_level: int, curr_frame = None):
+    def __init__(self, name: str, sc_level: int):
 
         super().__init__()
 
+        # Files opened in this frame, closed when the frame is left
+        self.files = None
+
+        self.reset(name, sc_level)
+
+    def reset(self, name: str, sc_level: int):
+        """
+        Readies the frame for a new call. Its memory must already be empty
+        """
+
         self.name = name
         self.sc_level = sc_level
 
-        self.context = None
-        if curr_frame:
-            self._find_context(curr_frame)
-
         self.ret_val = None
         self.returned = False
 
-    def _find_context(self, curr_frame: Record):
+        # Position of the statement the frame is running, kept up to date
+        # only while the interpreter tracks positions
+        self.pos = None
+
+        # Frame at the same level that this one hides from the display
+        self.hidden = None
+
+    def hold(self, file: Any) -> None:
+        """
+        Keeps a file open until the frame is left
+        """
+
+        if self.files is None:
+            self.files = []
 
-        nest_lvl = curr_frame.sc_level - self.sc_level + 1
-        self.context = curr_frame
+        self.files.append(file)
 
-        for i in range(nest_lvl):
-            self.context = self.context.context
+    def release(self) -> None:
+        """
+        Closes the files opened in this frame, except one being returned
+        """
+
+        for file in self.files:
+            if file is not self.ret_val:
+                file.close()
+
+        self.files = None
 
     def __str__(self) -> str:
         cont = 'TOP_LEVEL'
@@ -70,17 +98,39 @@ class ActivationRecord(Record):
 
 class CallStack(object):
     """
-    Represents a call stack
+    Represents a call stack. If it has a limit, it can hold at most that
+    many frames.
+
+    The stack also keeps a display: the innermost frame at each level, which
+    is the frame any variable declared at that level is found in.
     """
 
-    def __init__(self):
+    def __init__(self, limit: int = None, pooled: bool = True):
         self.stack = []
+        self.limit = limit
+
+        self.display = [None]
+
+        # Frames that have been left, ready to be reused by the next call.
+        # Frames are only pooled if nothing can refer to them once popped.
+        self.pooled = pooled
+        self._free = []
 
     def push(self, frame: Record) -> None:
         """
-        Pushes an item onto the stack
+        Pushes an item onto the stack, making it the frame seen at its level
         """
 
+        display = self.display
+        level = frame.sc_level
+
+        if level >= len(display):
+            display.extend([None] * (level + 1 - len(display)))
+
+        frame.context = display[level - 1]
+        frame.hidden = display[level]
+        display[level] = frame
+
         self.stack.append(frame)
 
     def pop(self) -> Any:
@@ -88,7 +138,57 @@ class CallStack(object):
         Pops an item off of the stack
         """
 
-        return self.stack.pop()
+        frame = self.stack.pop()
+        self.display[frame.sc_level] = frame.hidden
+
+        return frame
+
+    def frame(self, name: str, sc_level: int) -> ActivationRecord:
+        """
+        Returns a frame for a call, reusing one that has been released if
+        there is one
+        """
+
+        if self._free:
+            record = self._free.pop()
+            record.reset(name, sc_level)
+
+            return record
+
+        return ActivationRecord(name, sc_level)
+
+    def fork(self) -> "CallStack":
+        """
+        Returns a new stack that starts at this stack's top frame, and sees
+        the same enclosing frames
+        """
+
+        forked = CallStack(self.limit, pooled=False)
+
+        forked.stack.append(self.peek())
+        forked.display = self.display[:]
+
+        return forked
+
+    def release(self, record: ActivationRecord) -> None:
+        """
+        Gives back a frame that has been popped, so that it can be reused
+        """
+
+        if self.pooled:
+            record.memory.clear()
+            record.context = None
+            record.hidden = None
+            record.ret_val = None
+
+            self._free.append(record)
+
+    def full(self) -> bool:
+        """
+        Returns true if no more frames can be pushed
+        """
+
+        return self.limit is not None and len(self.stack) >= self.limit
 
     def peek(self) -> Any:
         """
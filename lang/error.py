@@ -2,20 +2,28 @@
 Utility module used for raising error messages
 """
 
-def error(msg: str, pos = None):
+from typing import Any, Tuple
+
+from lang.position import positions
+
+def where(pos: Any) -> Tuple[int, int]:
     """
-    Utility method to raise SyntaxError
+    Returns the line and column of a position, or of a token
     """
 
-    line = 0
-    col = 0
+    if type(pos) != int:
+        pos = getattr(pos, "pos", None)
+
+    if pos is None:
+        return 0, 0
 
-    if type(pos) == tuple:
-        line = pos[0]
-        col = pos[1]
+    return positions.locate(pos)
+
+def error(msg: str, pos = None):
+    """
+    Utility method to raise SyntaxError
+    """
 
-    elif pos:
-        line = pos.line
-        col = pos.col
+    line, col = where(pos)
 
     raise SyntaxError(f"{msg}, <line:{line},col:{col}>")
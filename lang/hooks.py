@@ -0,0 +1,183 @@
+from typing import Any, Iterable, List
+
+from lang.error import where
+from lang.ast import AST
+
+# Execution hooks. Each event is reported by methods that replace the handler
+# where the event happens, and an interpreter only takes on the methods for
+# events something listens for, so events nobody listens for cost nothing.
+# Counting the nodes evaluated, and tracking the statement each frame is
+# running, work the same way.
+#
+# The methods of every hook an interpreter needs are copied into a single
+# subclass of its class, rather than each hook being a base of it, since
+# visit methods are looked up by name on every visit and that takes longer
+# the more bases a class has. Hook methods call the handlers they replace
+# through the unhooked class.
+
+# Events a listener can have methods for
+EVENTS = ("on_call", "on_return", "on_line", "on_array_alloc")
+
+# Everything hook methods can be installed for. Methods of later hooks win,
+# so line listeners, which keep positions as well, come after positions.
+HOOKS = ("positions",) + EVENTS + ("nodes",)
+
+# Hooked classes made so far, by the class they hook and their hooks
+_classes = {}
+
+
+class CallHook(object):
+    """
+    Calls on_call(proc, frame) once the frame of a process call is pushed
+    """
+
+    def _enter(self, node: AST, args: List[Any]) -> None:
+        self.unhooked._enter(self, node, args)
+
+        frame = self.stack.peek()
+        for hook in self.hooks["on_call"]:
+            hook(node.value, frame)
+
+
+class ReturnHook(object):
+    """
+    Calls on_return(proc, value) once the frame of a process call is popped
+    """
+
+    def _leave(self, node: AST) -> Any:
+        value = self.unhooked._leave(self, node)
+
+        for hook in self.hooks["on_return"]:
+            hook(node.value, value)
+
+        return value
+
+
+class LineHook(object):
+    """
+    Calls on_line(line) before each statement runs, and keeps the position
+    of the frame running it up to date
+    """
+
+    def _execute_statements(self, statements: List[AST]) -> Any:
+        return self.unhooked._execute_statements(self, self._lines(statements))
+
+    def _execute_injected(self, statements: List[AST]) -> Any:
+        return self.unhooked._execute_injected(self, self._lines(statements))
+
+    def _lines(self, statements: List[AST]) -> Iterable[AST]:
+        """
+        Reports the line of each statement as it is taken from a block
+        """
+
+        hooks = self.hooks["on_line"]
+        lines = self.lines
+        record = self.stack.peek()
+
+        for statement in statements:
+            line = lines.get(statement.pos)
+
+            if line is None:
+                line, _ = where(statement.pos)
+                lines[statement.pos] = line
+
+            record.pos = statement.pos
+
+            for hook in hooks:
+                hook(line)
+
+            yield statement
+
+
+class ArrayAllocHook(object):
+    """
+    Calls on_array_alloc(size) with the number of elements of each array
+    allocated
+    """
+
+    def _allocate(self, pos: int, sizes: List[Any]) -> Any:
+        arr = self.unhooked._allocate(self, pos, sizes)
+
+        size = 1
+        for n in sizes:
+            size *= max(n, 0)
+
+        for hook in self.hooks["on_array_alloc"]:
+            hook(size)
+
+        return arr
+
+
+class PositionTracker(object):
+    """
+    Keeps the position of the statement each frame is running in its pos,
+    for anything that looks at the stack from outside the interpreter
+    """
+
+    def _execute_statements(self, statements: List[AST]) -> None:
+        record = self.stack.peek()
+
+        for statement in statements:
+            record.pos = statement.pos
+            self.visit(statement)
+
+            if record.returned:
+                return
+
+    def _execute_injected(self, statements: List[AST]) -> None:
+        record = self.stack.peek()
+
+        for statement in statements:
+            record.pos = statement.pos
+
+            if not self._inject(statement):
+                self.visit(statement)
+
+            if record.returned:
+                return
+
+
+class NodeCounter(object):
+    """
+    Counts each node evaluated in node_counts, by its class
+    """
+
+    def visit(self, node: AST) -> Any:
+        self.node_counts[type(node)] += 1
+        return self.unhooked.visit(self, node)
+
+
+mixins = {
+    "on_call"       : CallHook,
+    "on_return"     : ReturnHook,
+    "on_line"       : LineHook,
+    "on_array_alloc": ArrayAllocHook,
+    "nodes"         : NodeCounter,
+    "positions"     : PositionTracker
+}
+
+
+def hooked(cls: type, names: Iterable[str]) -> type:
+    """
+    Returns a subclass of an interpreter class with the methods of the given
+    hooks
+    """
+
+    base = getattr(cls, "unhooked", cls)
+    names = frozenset(names)
+
+    if (base, names) not in _classes:
+        methods = {"unhooked": base, "__module__": base.__module__}
+
+        for name in HOOKS:
+            if name not in names:
+                continue
+
+            # A hook can extend another, whose methods it takes on as well
+            for mixin in reversed(base.hook_mixins[name].__mro__[:-1]):
+                methods.update((key, value) for key, value in vars(mixin).items()
+                               if not key.startswith("__"))
+
+        _classes[(base, names)] = type(base.__name__, (base,), methods)
+
+    return _classes[(base, names)]
@@ -0,0 +1,467 @@
+import re
+
+import lang.builtins as builtins
+
+from bisect import bisect_left
+from typing import List, Tuple, Iterator
+
+from lang.tokenizer import Tokenizer
+from lang.position import Source
+from lang.parser import Parser
+from lang.ast import AST, Program
+from lang.symtab import Symbol, SymbolTable
+
+# Incremental front end
+
+# Everything that can open or close a top level statement. Strings and comments
+# are matched whole so that the characters inside them are skipped.
+_SCAN = re.compile(r"'(?:[^'\\]|\\+[^\\])*'|#[^\n]*|[{}();]")
+
+# A closing brace followed by one of these continues a conditional block
+_CONTINUED = re.compile(r"(?:\s|#[^\n]*)*(?:elif|else)\b")
+
+
+def _split(text: str, pos: int) -> Iterator[Tuple[int, int]]:
+    """
+    Splits text into the spans of its top level statements, starting at pos.
+    A span ends with the ';' or '}' that closes the statement, and includes
+    the whitespace and comments leading up to the statement.
+    """
+
+    start = pos
+    braces = 0
+    parens = 0
+
+    for match in _SCAN.finditer(text, pos):
+        char = match.group()
+
+        if char == '{':
+            braces += 1
+
+        elif char == '(':
+            parens += 1
+
+        elif char == ')':
+            parens = max(parens - 1, 0)
+
+        elif char == '}':
+            braces -= 1
+
+            if braces <= 0 and not _CONTINUED.match(text, match.end()):
+                braces = parens = 0
+
+                yield start, match.end()
+                start = match.end()
+
+        elif char == ';' and braces == 0 and parens == 0:
+            yield start, match.end()
+            start = match.end()
+
+    if start < len(text):
+        yield start, len(text)
+
+
+def _signature(symbol: Symbol) -> tuple:
+    """
+    Returns what a statement relies on when it refers to a symbol
+    """
+
+    if symbol is None:
+        return None
+
+    if symbol.is_proc:
+        return (True, symbol.type_def, tuple(p.var_type for p in symbol.params))
+
+    return (False, symbol.type_def)
+
+
+class _TrackingTable(SymbolTable):
+    """
+    Global symbol table that records the names a statement looks up, along
+    with what they referred to, and the names it declares
+    """
+
+    def __init__(self):
+        self.deps = {}
+        self.declared = []
+
+        super().__init__()
+        builtins.declare(self)
+
+    def __setitem__(self, key: str, symbol: Symbol):
+        super().__setitem__(key, symbol)
+
+        if self.sc_level == 1:
+            self.declared.append(key)
+
+    def declare_enclosing(self, key: str, symbol: Symbol) -> None:
+        super().declare_enclosing(key, symbol)
+
+        if self.sc_level == 2:
+            self.declared.append(key)
+
+    def lookup(self, key: str) -> Symbol:
+        entries = self._symbols.get(key)
+        symbol = entries[-1][1] if entries else self._builtins.get(key)
+
+        # Only names that resolve outside of the statement are dependencies
+        if (not entries or entries[-1][0] == 1) and key not in self.deps:
+            self.deps[key] = _signature(symbol)
+
+        return symbol
+
+
+class _Entry(object):
+    """
+    A parsed top level statement, along with the symbols it relied on and the
+    symbols it declared. The positions of its nodes are in its own source,
+    so that they all move along with it.
+    """
+
+    def __init__(self, text: str, pos: Tuple[int, int], statements: List[AST],
+                 source: Source, deps: dict, effects: dict, spawns: bool = False):
+        self.text = text
+        self.pos = pos
+        self.statements = statements
+        self.source = source
+        self.spawns = spawns
+
+        self.deps = deps
+        self.effects = effects
+
+    def shift(self, lines: int, col_line: int = 0, cols: int = 0) -> None:
+        """
+        Moves the statement down by a number of lines. Tokens on col_line are
+        also moved right by a number of columns.
+        """
+
+        line, col = self.pos
+        if not lines and (not cols or line != col_line):
+            return
+
+        if line == col_line:
+            self.source.col += cols
+
+        self.source.line += lines
+
+        self.pos = (line + lines, col + cols if line == col_line else col)
+
+    def valid(self, table: SymbolTable) -> bool:
+        """
+        Returns true if every symbol the statement relied on is unchanged
+        """
+
+        for key, sig in self.deps.items():
+            if _signature(table.get_global(key)) != sig:
+                return False
+
+        return True
+
+    def bind(self) -> None:
+        """
+        Gives the statement's process symbols the processes it declared
+        """
+
+        for symbol, process, params in self.effects.values():
+            if symbol.is_proc:
+                symbol.process = process
+                symbol.params = params
+
+    def apply(self, table: SymbolTable) -> None:
+        """
+        Declares the statement's symbols again
+        """
+
+        self.bind()
+
+        for key, (symbol, _, _) in self.effects.items():
+            table.set_global(key, symbol)
+
+
+class IncrementalParser(object):
+    """
+    Parses successive versions of a program. Each top level statement or
+    process is cached along with the symbols it relied on, so that after an
+    edit only the statements that changed, or that refer to a declaration
+    that changed, are parsed again.
+    """
+
+    def __init__(self):
+        """
+        Initializes the parser with an empty program
+        """
+
+        self.text = ''
+        self.symtab = _TrackingTable()
+        self.program = Program()
+
+        # Number of statements parsed by the last update
+        self.parsed = 0
+
+        self._spans = []
+        self._entries = []
+
+        # Maps each global name to the entry that declares it
+        self._where = {}
+
+    def _parse(self, parser: Parser, text: str, pos: Tuple[int, int],
+               old: SymbolTable) -> _Entry:
+        """
+        Parses a single span against the global symbols declared before it
+        """
+
+        table = parser.symtab
+        table.deps = {}
+        table.declared = []
+
+        tokenizer = Tokenizer(text, *pos)
+        parser.reset(tokenizer)
+
+        try:
+            statements = parser.parse().statements
+
+        finally:
+            table.unwind()
+
+        effects = {}
+        for key in table.declared:
+            symbol = table.get_global(key)
+
+            if not symbol.is_proc:
+                effects[key] = (symbol, None, None)
+                continue
+
+            process, params = symbol.process, symbol.params
+
+            prev = old.get_global(key)
+            if prev is not None and _signature(prev) == _signature(symbol):
+                # Keep the previous symbol so that cached callers stay valid.
+                # It is only given the new process once the update succeeds.
+                table.set_global(key, prev)
+                symbol = prev
+
+            effects[key] = (symbol, process, params)
+
+        self.parsed += 1
+        return _Entry(text, pos, statements, tokenizer.source, table.deps, effects, parser.spawns)
+
+    def _diff(self, text: str) -> Tuple[int, list, int]:
+        """
+        Splits the new text into spans, reusing the spans that lie entirely
+        before or after the edited region. Returns the index of the first
+        edited span, the new spans, and the number of old spans reused after
+        the edit.
+        """
+
+        old_text = self.text
+        old_spans = self._spans
+
+        if not old_spans:
+            return 0, list(_split(text, 0)), 0
+
+        n = min(len(old_text), len(text))
+
+        # Common prefix and suffix, comparing slices to stay in C
+        lo, hi = 0, n
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if old_text[:mid] == text[:mid]:
+                lo = mid
+            else:
+                hi = mid - 1
+        prefix = lo
+
+        lo, hi = 0, n - prefix
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if old_text[len(old_text) - mid:] == text[len(text) - mid:]:
+                lo = mid
+            else:
+                hi = mid - 1
+        suffix = lo
+
+        ends = [end for _, end in old_spans]
+        first = min(bisect_left(ends, prefix), len(old_spans) - 1)
+
+        if first and old_text[ends[first - 1] - 1] == '}':
+            # The edit might add an 'elif' or 'else' to the statement before
+            first -= 1
+
+        delta = len(text) - len(old_text)
+        spans = old_spans[:first]
+
+        for start, end in _split(text, old_spans[first][0]):
+            spans.append((start, end))
+
+            if end < len(text) - suffix:
+                continue
+
+            i = bisect_left(ends, end - delta)
+            if i < len(ends) and ends[i] == end - delta and i >= first:
+                after = old_spans[i + 1:]
+                spans.extend((start + delta, end + delta) for start, end in after)
+
+                return first, spans, len(after)
+
+        return first, spans, 0
+
+    def update(self, text: str) -> Program:
+        """
+        Parses a new version of the program, returning its tree
+        """
+
+        first, spans, n_after = self._diff(text)
+        n_spans = len(spans)
+        n_edited = n_spans - n_after
+
+        old_entries = self._entries
+        old_table = self.symtab
+        old_statements = self.program.statements
+
+        n_before = len(old_entries) - n_after
+        edited = old_entries[first:n_before]
+        after = old_entries[n_before:]
+
+        table = _TrackingTable()
+
+        # Global symbols as they stood before the first edited statement
+        where = {key: e for key, e in self._where.items() if e.index < first}
+        table.inherit(old_table, where)
+
+        parser = Parser(Tokenizer(''))
+        parser.symtab = table
+
+        # Statements from the edited region can still be picked up by text
+        candidates = {}
+        for entry in edited:
+            candidates.setdefault(entry.text, []).append(entry)
+
+        self.parsed = 0
+        entries = old_entries[:first]
+        statements = old_statements[:old_entries[first].offset] if first < len(old_entries) \
+            else old_statements[:]
+
+        statements_before = len(statements)
+
+        # Entries kept from the old version, with where they go, and entries
+        # parsed again. Neither touch anything the old version still uses
+        # until every statement has parsed, so that a failed update leaves
+        # the old version as it was.
+        kept = []
+        parsed = []
+
+        prev = spans[first][0] if first < n_spans else 0
+        line = text.count('\n', 0, prev) + 1
+        line_start = text.rfind('\n', 0, prev) + 1
+
+        for i in range(first, n_spans):
+            start, end = spans[i]
+
+            newlines = text.count('\n', prev, start)
+            if newlines:
+                line += newlines
+                line_start = text.rfind('\n', prev, start) + 1
+
+            pos = (line, start - line_start + 1)
+            prev = start
+
+            if i == n_edited and self._unchanged(edited, entries[first:]):
+                # Nothing after the edit can be affected, so it is kept as is
+                head = after[0]
+                statements.extend(old_statements[head.offset:])
+                entries.extend(after)
+
+                self._move(after, pos, i - head.index, statements_before - head.offset)
+
+                # The old table already holds the symbols declared after the edit
+                for entry in entries[first:i]:
+                    for key, (symbol, _, _) in entry.effects.items():
+                        old_table.set_global(key, symbol)
+
+                where = {**self._where, **where}
+                table = old_table
+                break
+
+            if i >= n_edited:
+                entry = after[i - n_edited]
+            else:
+                cached = candidates.get(text[start:end])
+                entry = cached.pop() if cached else None
+
+            if entry and entry.valid(table):
+                entry.apply(table)
+                kept.append((entry, pos, i, len(statements)))
+            else:
+                entry = self._parse(parser, text[start:end], pos, old_table)
+                entry.index = i
+                entry.offset = len(statements)
+                parsed.append(entry)
+
+            statements.extend(entry.statements)
+            statements_before = len(statements)
+
+            entries.append(entry)
+            where.update((key, entry) for key in entry.effects)
+
+        for entry, pos, index, offset in kept:
+            entry.shift(pos[0] - entry.pos[0], entry.pos[0], pos[1] - entry.pos[1])
+            entry.index = index
+            entry.offset = offset
+
+        for entry in parsed:
+            entry.bind()
+
+        self.text = text
+        self.symtab = table
+
+        self._spans = spans
+        self._entries = entries
+        self._where = where
+
+        self.program = Program(statements, [entry.source for entry in entries],
+                               any(entry.spawns for entry in entries))
+        return self.program
+
+    def _move(self, entries: List[_Entry], pos: Tuple[int, int],
+              indices: int, offsets: int) -> None:
+        """
+        Moves statements kept from after the edit to their new position
+        """
+
+        col_line, col = entries[0].pos
+        lines = pos[0] - col_line
+        cols = pos[1] - col
+
+        if not (lines or indices or offsets):
+            # Only the statements sharing the edited line have moved
+            for entry in entries:
+                if entry.pos[0] != col_line:
+                    return
+
+                entry.shift(0, col_line, cols)
+
+            return
+
+        for entry in entries:
+            entry.shift(lines, col_line, cols)
+
+            entry.index += indices
+            entry.offset += offsets
+
+    def _unchanged(self, edited: List[_Entry], entries: List[_Entry]) -> bool:
+        """
+        Returns true if the edited statements declare the same names, with
+        the same signatures, as they did before the edit
+        """
+
+        before = {key: e[0] for entry in edited for key, e in entry.effects.items()}
+        after = {key: e[0] for entry in entries for key, e in entry.effects.items()}
+
+        if before.keys() != after.keys():
+            return False
+
+        for key, symbol in after.items():
+            if _signature(symbol) != _signature(before[key]):
+                return False
+
+        return True
@@ -1,13 +1,20 @@
+import sys
 
-from typing import Any, List
+from collections import defaultdict
+from typing import Any, List, Tuple
 
-import lang.token as tok
 import lang.validation as validation
+import lang.operators as operators
+import lang.parallel as parallel
+import lang.hooks as hooks
 
 from lang.error import error
-from lang.tokenizer import Token, Tokenizer
+from lang.tokenizer import Tokenizer
 from lang.parser import Parser
-from lang.ast import AST
+from lang.task import Task
+from lang.stream import File
+from lang.array import FlatArray, SparseArray, allocate
+from lang.ast import AST, AssignmentStatement, VariableDeclaration, ProcessCall
 from lang.callstack import CallStack, ActivationRecord, Record
 
 # Interpreter
@@ -35,45 +42,132 @@ class Visitor(object):
         return
 
 
+def _overflowed_call(overflow: RecursionError) -> AST:
+    """
+    Returns the innermost process call being visited when python ran out of
+    stack, or the innermost node if no call was (as for a deep expression),
+    found from the frames the error unwound
+    """
+
+    call = deepest = None
+    tb = overflow.__traceback__
+
+    while tb is not None:
+        node = tb.tb_frame.f_locals.get("node")
+
+        if isinstance(node, ProcessCall):
+            call = node
+
+        if isinstance(node, AST) and hasattr(node, "pos"):
+            deepest = node
+
+        tb = tb.tb_next
+
+    return call or deepest
+
+
 class Interpreter(Visitor):
     """
     Evaluates expressions from the parser
     """
 
-    def __init__(self, text: str):
+    # Maps each event listeners can hear, node counting and position
+    # tracking to its mixin
+    hook_mixins = hooks.mixins
+
+    def __init__(self, text: str = None, out: Any = None, values: dict = None,
+                 stack_limit: int = None):
         """
-        Initializes interpreter with a parser, used to eval. expressions
+        Initializes interpreter with a parser, used to eval. expressions. If no
+        text is given, the interpreter can only execute trees that have
+        already been parsed. Output from say goes to out (stdout by default),
+        values replace the initial values of top level variables, and
+        stack_limit caps the number of frames on the call stack.
         """
 
-        self.parser = Parser(Tokenizer(text))
-        self.stack = CallStack()
+        self.parser = Parser(Tokenizer(text)) if text is not None else None
+        self.stack = CallStack(stack_limit)
 
-    def _cou_str(self, conv: Any) -> str:
+        self.out = out if out else sys.stdout
+        self.values = values
+
+        # An array given as an initial value can be smaller than the one the
+        # program allocates, so elements proven safe are checked all the same
+        self.trusted = not (values and any(validation.is_array(value)
+                                           for value in values.values()))
+
+        # Maps each event to the listener methods called on it
+        self.hooks = {}
+
+        # Lines of the statements reported to listeners, by position
+        self.lines = {}
+
+        # Number of nodes of each class evaluated, once counting has started
+        self.node_counts = None
+
+        # Whether frames keep the position of the statement they are running
+        self.tracking = False
+
+    def listen(self, listener: Any) -> None:
         """
-        Utility function to convert to string
+        Registers a listener for events during execution. A listener can have
+        any of the methods on_call(proc, frame), on_return(proc, value),
+        on_line(line) and on_array_alloc(size). The interpreter only starts
+        reporting an event once something listens for it.
+        """
+
+        events = [event for event in hooks.EVENTS if hasattr(listener, event)]
+
+        for event in events:
+            self.hooks.setdefault(event, []).append(getattr(listener, event))
+
+        if events:
+            self._hook()
+
+    def count_nodes(self) -> None:
+        """
+        Starts counting the nodes evaluated, by class, in node_counts
+        """
+
+        self.node_counts = defaultdict(int)
+        self._hook()
+
+    def track_positions(self) -> None:
+        """
+        Starts keeping the position of the statement each frame is running
+        in the frame's pos
         """
 
-        s_conv = str(conv)
+        self.tracking = True
+        self._hook()
 
-        if isinstance(conv, list):
-            n = len(conv)
-            s_conv = '['
+    def _hook(self) -> None:
+        """
+        Replaces the interpreter's class with one that has the mixins for the
+        events listened for, for counting nodes if it has started, and for
+        tracking positions if it has started
+        """
+
+        names = list(self.hooks)
 
-            for i, elem in enumerate(conv):
-                s_conv += f"{self._cou_str(elem)}"
-                if i < n - 1:
-                    s_conv += ', '
-            s_conv += ']'
+        if self.node_counts is not None:
+            names.append("nodes")
 
-        elif isinstance(conv, bool):
-            # Make it so that the string representation of booleans begin lower
-            s_conv = s_conv.lower()
+        if self.tracking:
+            names.append("positions")
 
-        elif isinstance(conv, type(None)):
-            # None -> nothing
-            s_conv = 'nothing'
+        self.__class__ = hooks.hooked(type(self), names)
 
-        return s_conv
+        # Attributes are slower to look up on an object whose class was
+        # replaced, until it is given a new dictionary
+        self.__dict__ = dict(self.__dict__)
+
+    def _cou_str(self, conv: Any) -> str:
+        """
+        Utility function to convert to string
+        """
+
+        return operators.cou_str(conv)
 
     def _number(self, node: AST) -> int:
         """
@@ -108,22 +202,39 @@ class Interpreter(Visitor):
         Visits an array element
         """
 
-        token = node.token
+        pos = node.pos
+        arr = self.stack.display[node.depth][node.arr_name]
 
-        record = self.stack.peek()
-        arr = record[node.arr_name]
+        if type(arr) == SparseArray and arr.dense is not None:
+            arr = self._dense(node.depth, node.arr_name)
 
         indices = node.indices
+
+        if node.safe and self.trusted:
+            return arr[self.visit(indices[0])]
+
+        if type(arr) == FlatArray:
+            values = []
+            for index in indices:
+                values.append(self.visit(index))
+
+            cell = arr.locate(values)
+
+            if cell is not None and len(values) == arr.ndim:
+                return arr.cells[cell]
+
+            return self._flat_element(pos, arr, values, cell)
+
         asn_i = len(indices) - 1
 
         for i in range(asn_i):
             index = self.visit(indices[i])
-            validation.validate_array_index(token, index, arr)
+            validation.validate_array_index(pos, index, arr)
 
             arr = arr[index]
 
         index = self.visit(indices[asn_i])
-        validation.validate_array_index(token, index, arr)
+        validation.validate_array_index(pos, index, arr)
         return arr[index]
 
     def _array_element_assignment(self, node: AST) -> None:
@@ -131,138 +242,203 @@ class Interpreter(Visitor):
         Visits an array element assignment
         """
 
-        token = node.token
+        pos = node.pos
+        arr = self.stack.display[node.left.depth][node.left.arr_name]
 
-        record = self.stack.peek()
-        arr = record[node.left.arr_name]
+        if type(arr) == SparseArray and arr.dense is not None:
+            arr = self._dense(node.left.depth, node.left.arr_name)
 
         indices = node.left.indices
+
+        if node.left.safe and self.trusted:
+            index = self.visit(indices[0])
+            arr[index] = self.visit(node.right)
+            return
+
+        if type(arr) == FlatArray:
+            values = []
+            for index in indices:
+                values.append(self.visit(index))
+
+            cell = arr.locate(values)
+
+            if cell is not None and len(values) == arr.ndim:
+                arr = arr.cells
+            else:
+                arr, cell = self._flat_cell(pos, arr, values, cell)
+
+            arr[cell] = self.visit(node.right)
+            return
+
         asn_i = len(indices) - 1
 
         for i in range(asn_i):
             index = self.visit(indices[i])
-            validation.validate_array_index(token, index, arr)
+            validation.validate_array_index(pos, index, arr)
 
             arr = arr[index]
 
         index = self.visit(indices[asn_i])
-        validation.validate_array_index(token, index, arr)
+        validation.validate_array_index(pos, index, arr)
         arr[index] = self.visit(node.right)
 
+    def _dense(self, depth: int, name: str) -> list:
+        """
+        Replaces a sparse array that has become dense with its list, in the
+        frame holding it
+        """
+
+        record = self.stack.display[depth]
+        arr = record[name] = record[name].dense
+
+        return arr
 
-    def _array_initialization(self, node: AST) -> None:
+    def _index(self, pos: int, arr: Any, indices: List[Any]) -> Any:
         """
-        Visits an array assignment
+        Indexes an array one dimension at a time, given the values of its
+        indices
         """
 
-        size = self.visit(node.size)
-        validation.validate_array_size(node.token, size)
+        for index in indices:
+            validation.validate_array_index(pos, index, arr)
+            arr = arr[index]
 
-        return [None] * size
+        return arr
 
-    def _unary_operator(self, node: AST) -> Any:
+    def _flat_element(self, pos: int, arr: FlatArray, indices: List[Any], cell: int) -> Any:
         """
-        Visits a unary operator (can be +/-)
+        Indexes a flat array where its indices do not pick out a single cell,
+        given their values and the cell arr.locate found for them
         """
 
-        op_type = node.value
-        token = node.token
+        if cell is None:
+            # Find which index is wrong, or index into the cell's own value
+            return self._index(pos, arr, indices)
+
+        return arr.row(len(indices), cell)
 
-        operand = self.visit(node.child)
-        validation.validate_operation(op_type, token, operand)
+    def _flat_cell(self, pos: int, arr: FlatArray, indices: List[Any], cell: int) -> Tuple[Any, Any]:
+        """
+        Finds where an element of a flat array is stored, as a container and
+        a position in it, where its indices do not pick out a single cell
+        """
 
-        if op_type == tok.NOT:
-            return not operand
+        if cell is not None:
+            if len(indices) < arr.ndim:
+                error("Cannot replace a row of a multi-dimensional array", pos)
 
-        if op_type == tok.ADD:
-            return operand
+            return arr.cells, cell
 
-        if op_type == tok.SUB:
-            return -operand
+        arr = self._index(pos, arr, indices[:-1])
+        validation.validate_array_index(pos, indices[-1], arr)
 
-        token = node.token
-        error(f"Invalid unary operator {op_type}", token)
+        return arr, indices[-1]
 
-    def _binary_operator(self, node: AST) -> Any:
+    def _array_initialization(self, node: AST) -> Any:
         """
-        Visits a binary operator node on the AST (will recur until a number is
-        retrieved)
+        Visits an array assignment
         """
 
-        op_type = node.value
+        sizes = [self.visit(size) for size in node.sizes]
+        return self._allocate(node.pos, sizes)
 
-        l = self.visit(node.left)
-        r = self.visit(node.right)
+    def _allocate(self, pos: int, sizes: List[Any]) -> Any:
+        """
+        Allocates an array of nothing. Arrays with more than one dimension
+        are held in a single flat list, and large arrays are sparse.
+        """
 
-        token = node.token
-        validation.validate_operation(op_type, token, l, r)
+        for size in sizes:
+            validation.validate_array_size(pos, size)
 
-        if op_type == tok.ADD:
+        if len(sizes) == 1:
+            return allocate(sizes[0])
 
-            if type(l) == str:
-                r = self._cou_str(r)
+        # Negative sizes give empty dimensions, as they do for lists
+        return FlatArray.create(tuple(max(size, 0) for size in sizes))
 
-            elif type(r) == str:
-                l = self._cou_str(l)
+    def _unary_operator(self, node: AST) -> Any:
+        """
+        Visits a unary operator (can be +/-)
+        """
+
+        return self._unary(node.value, node.pos, self.visit(node.child))
+
+    def _unary(self, op_type: str, pos: int, operand: Any) -> Any:
+        """
+        Applies a unary operator to the value of its operand
+        """
 
-            return l + r
+        function = operators.unary.get((op_type, type(operand)))
 
-        if op_type == tok.SUB:
-            return l - r
+        if function is None:
+            error(f"Invalid operation {op_type} for type "
+                  f"'{validation.type_name(operand)}'", pos)
 
-        if op_type == tok.MUL:
-            return l * r
+        return function(operand)
 
-        if op_type == tok.DIV:
-            return l / r
+    def _binary_operator(self, node: AST) -> Any:
+        """
+        Visits a binary operator node on the AST (will recur until a number is
+        retrieved)
+        """
 
-        if op_type == tok.MOD:
-            return l % r
+        l = self.visit(node.left)
+        r = self.visit(node.right)
 
-        if op_type == tok.I_DIV:
-            return l // r
+        return self._binary(node.value, node.pos, l, r)
 
-        if op_type == tok.OR:
-            return l or r
+    def _logical_operator(self, node: AST) -> Any:
+        """
+        Visits && or ||, only visiting the right operand if the left one
+        does not decide the result
+        """
 
-        if op_type == tok.AND:
-            return l and r
+        l = self.visit(node.left)
 
-        if op_type == tok.EQ:
-            return l == r
+        if l is node.decides:
+            return l
 
-        if op_type == tok.NEQ:
-            return l != r
+        r = self.visit(node.right)
 
-        if op_type == tok.GREATER:
-            return l > r
+        return self._binary(node.value, node.pos, l, r)
 
-        if op_type == tok.GEQ:
-            return l >= r
+    def _binary(self, op_type: str, pos: int, l: Any, r: Any) -> Any:
+        """
+        Applies a binary operator to the values of its operands
+        """
 
-        if op_type == tok.LESS:
-            return l < r
+        function = operators.binary.get((op_type, type(l), type(r)))
 
-        if op_type == tok.LEQ:
-            return l <= r
+        if function is None:
+            error(f"Invalid operation {op_type} between types "
+                  f"'{validation.type_name(l)}' and '{validation.type_name(r)}'", pos)
 
-        error(f"Invalid binary operator '{op_type}'", token)
+        return function(l, r)
 
     def _variable(self, node: AST) -> AST:
         """
         Interprets a variable
         """
 
-        record = self.stack.peek()
-        return record[node.value]
+        return self.stack.display[node.depth][node.value]
+
+    def _shared_expression(self, node: AST) -> Any:
+        """
+        Interprets an expression whose value is kept for later copies of it
+        """
+
+        value = self.visit(node.expression)
+        self.stack.display[node.depth].memory[node.value] = value
+
+        return value
 
     def _variable_declaration(self, node: AST) -> None:
         """
         Interprets a variable declaration
         """
 
-        record = self.stack.peek()
-        record[node.value] = None
+        self.stack.peek().memory[node.value] = None
 
     def _say(self, node: AST) -> None:
         """
@@ -270,7 +446,7 @@ class Interpreter(Visitor):
         """
 
         visited = self.visit(node.value)
-        print(self._cou_str(visited))
+        print(self._cou_str(visited), file=self.out)
 
     def _assignment_statement(self, node: AST) -> None:
         """
@@ -279,13 +455,12 @@ class Interpreter(Visitor):
 
         var_id = node.left.value
         var_type = node.left.var_type
-        token = node.token
+        pos = node.pos
 
         asn = self.visit(node.right)
-        validation.validate_type(var_type, token, asn)
+        validation.validate_type(var_type, pos, asn)
 
-        record = self.stack.peek()
-        record[var_id] = asn
+        self.stack.display[node.left.depth].memory[var_id] = asn
 
     def _conditions(self, node: AST) -> None:
         """
@@ -295,7 +470,7 @@ class Interpreter(Visitor):
         for cond in node.conditions:
 
             eval = self.visit(cond.condition)
-            validation.validate_condition(cond.token, eval)
+            validation.validate_condition(cond.pos, eval)
 
             if eval:
                 self.visit(cond.block)
@@ -307,22 +482,38 @@ class Interpreter(Visitor):
         """
 
         counter = node.declr.counter
-        condition = node.declr.condition
-        do_after = node.declr.after
 
         if counter:
             self.visit(counter)
 
+        if node.parallel:
+            parallel.run(self, node)
+        else:
+            self._loop(node)
+
+    def _loop(self, node: AST) -> None:
+        """
+        Runs an as loop after its counter has been initialized
+        """
+
+        condition = node.declr.condition
+        do_after = node.declr.after
+
+        record = self.stack.peek()
+
         condition_eval = self.visit(condition)
-        validation.validate_condition(node.token, condition_eval)
+        validation.validate_condition(node.pos, condition_eval)
 
         while condition_eval:
             self.visit(node.block)
+            if record.returned:
+                return
+
             if do_after:
                 self.visit(do_after)
 
             condition_eval = self.visit(condition)
-            validation.validate_condition(node.token, condition_eval)
+            validation.validate_condition(node.pos, condition_eval)
 
 
     def _return(self, node: AST) -> None:
@@ -341,23 +532,121 @@ class Interpreter(Visitor):
         Interprets a process call
         """
 
-        proc_name = node.value
+        args = [self.visit(arg) for arg in node.args]
+
+        if node.proc_sym.is_builtin:
+            return self._builtin(node, args)
+
+        self._enter(node, args)
+        self.visit(node.proc_sym.process.block)
+
+        return self._leave(node)
+
+    def _enter(self, node: AST, args: List[Any]) -> None:
+        """
+        Pushes the frame for a process call, given the values of its arguments
+        """
+
         proc_sym = node.proc_sym
 
-        record = ActivationRecord(
-            proc_name, proc_sym.sc_level, self.stack.peek())
+        if self.stack.full():
+            error(f"Stack overflow, the call stack is limited to {self.stack.limit} frames", node.pos)
 
-        for param, arg in zip(proc_sym.params, node.args):
-            record[param.value] = self.visit(arg)
+        record = self.stack.frame(node.value, proc_sym.sc_level)
+
+        # Parameters cannot shadow outer names, so they go straight into the
+        # frame's own memory
+        record.memory.update(zip(proc_sym.param_names, args))
 
         self.stack.push(record)
-        self.visit(proc_sym.process.block)
 
-        ret_val = self.stack.pop().ret_val
-        validation.validate_return(proc_sym.type_def, node.token, ret_val)
+    def _leave(self, node: AST) -> Any:
+        """
+        Pops the frame of a process call that has finished, returning its value
+        """
+
+        record = self.stack.pop()
+        ret_val = record.ret_val
+
+        if record.files:
+            record.release()
+
+            if type(ret_val) == File:
+                # A returned file belongs to the caller from now on
+                self.stack.peek().hold(ret_val)
+
+        self.stack.release(record)
+
+        validation.validate_return(node.proc_sym.type_def, node.pos, ret_val)
+        return ret_val
+
+    def _inlined_call(self, node: AST) -> Any:
+        """
+        Interprets a process call inlined by the optimizer
+        """
+
+        args = [self.visit(arg) for arg in node.args]
+
+        record = self.stack.peek()
+        record.memory.update(zip(node.params, args))
+
+        self.visit(node.block)
+        return self._inlined_return(node, record)
+
+    def _inlined_return(self, node: AST, record: ActivationRecord) -> Any:
+        """
+        Takes the value an inlined call returned from the caller's frame,
+        which carries on as if it had not returned
+        """
+
+        ret_val = record.ret_val
+
+        record.ret_val = None
+        record.returned = False
+
+        validation.validate_return(node.type_def, node.pos, ret_val)
+        return ret_val
+
+    def _check_args(self, node: AST, args: List[Any]) -> None:
+        """
+        Validates the arguments of a call to a builtin process
+        """
 
+        for param, arg in zip(node.proc_sym.params, args):
+            validation.validate_argument(param.var_type, node.pos, param.value, arg)
+
+    def _builtin(self, node: AST, args: List[Any]) -> Any:
+        """
+        Calls a builtin process
+        """
+
+        self._check_args(node, args)
+        ret_val = node.proc_sym.call(node.pos, *args)
+
+        if type(ret_val) == File:
+            self.stack.peek().hold(ret_val)
+
+        validation.validate_return(node.proc_sym.type_def, node.pos, ret_val)
         return ret_val
 
+    def _spawn(self, node: AST) -> Task:
+        """
+        Interprets a spawned process call. Without an event loop to run tasks
+        on, the call runs to completion straight away.
+        """
+
+        return Task(result=self.visit(node.call))
+
+    def _await(self, node: AST) -> Any:
+        """
+        Interprets waiting for a task
+        """
+
+        task = self.visit(node.child)
+        validation.validate_task(node.pos, task)
+
+        return task.result
+
     def _execute_statements(self, statements: List[AST]) -> None:
         """
         Executes a list of statements until a return or end of block is hit
@@ -370,6 +659,49 @@ class Interpreter(Visitor):
             if record.returned:
                 return  # Return when we hit a ret statement
 
+    def _str_buffer(self, node: AST) -> None:
+        """
+        Interprets a loop that builds up str variables in buffers
+        """
+
+        records = self._open_buffers(node)
+        self.visit(node.loop)
+        self._close_buffers(node, records)
+
+    def _open_buffers(self, node: AST) -> List[Record]:
+        """
+        Replaces the values of the variables a loop builds up with buffers,
+        returning the frames they live in
+        """
+
+        records = [self.stack.display[var.depth] for var in node.variables]
+
+        for record, var in zip(records, node.variables):
+            record.memory[var.value] = [record.memory[var.value]]
+
+        return records
+
+    def _close_buffers(self, node: AST, records: List[Record]) -> None:
+        """
+        Joins the buffers of the variables a loop built up back into strings
+        """
+
+        for record, var in zip(records, node.variables):
+            record.memory[var.value] = ''.join(record.memory[var.value])
+
+    def _str_append(self, node: AST) -> None:
+        """
+        Interprets appending to a str variable that is being built up
+        """
+
+        parts = []
+        for part in node.parts:
+            value = self.visit(part)
+            parts.append(value if type(value) == str else self._cou_str(value))
+
+        var = node.variable
+        self.stack.display[var.depth].memory[var.value].extend(parts)
+
     def _block(self, node: AST) -> None:
         """
         Interprets a block of code
@@ -385,13 +717,74 @@ class Interpreter(Visitor):
         record = ActivationRecord("main", 1)
         self.stack.push(record)
 
-        self._execute_statements(node.statements)
+        if self.values:
+            self._execute_injected(node.statements)
+        else:
+            self._execute_statements(node.statements)
+
+        self._exit()
+
+    def _exit(self) -> None:
+        """
+        Pops the main frame once the program has finished
+        """
+
+        record = self.stack.pop()
+
+        if record.files:
+            record.release()
+
+    def _execute_injected(self, statements: List[AST]) -> None:
+        """
+        Executes top level statements, using injected values in place of the
+        initial values of the variables they declare
+        """
+
+        record = self.stack.peek()
+
+        for statement in statements:
+            if not self._inject(statement):
+                self.visit(statement)
+
+            if record.returned:
+                return
+
+    def _inject(self, statement: AST) -> bool:
+        """
+        Gives the variable declared by a top level statement its injected
+        value, returning false if the statement has to run instead
+        """
+
+        if not (isinstance(statement, AssignmentStatement) and
+                isinstance(statement.left, VariableDeclaration) and
+                statement.left.value in self.values):
+            return False
+
+        asn = self.values[statement.left.value]
+        validation.validate_type(statement.left.var_type, statement.pos, asn)
+
+        self.stack.peek()[statement.left.value] = asn
+        return True
+
+    def execute(self, tree: AST) -> None:
+        """
+        Interprets a tree that has already been parsed
+        """
+
+        try:
+            self.visit(tree)
 
-        self.stack.pop()
+        except RecursionError as overflow:
+            # Each call and each level of an expression nests python frames,
+            # so deep recursion runs out of python stack long before it runs
+            # out of memory
+            error(f"Stack overflow in '{self.stack.peek().name}', "
+                  "use --stackless for deeper recursion and expressions",
+                  _overflowed_call(overflow))
 
     def interpret(self) -> None:
         """
         Interprets a line of text.
         """
 
-        self.visit(self.parser.parse())
+        self.execute(self.parser.parse())
@@ -0,0 +1,220 @@
+import time
+
+from collections import Counter
+from typing import Any, Dict
+
+from lang.tokenizer import Token, Tokenizer
+
+# Runtime metrics
+
+# Upper bounds, in seconds, of the buckets phase durations are counted in
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram(object):
+    """
+    Counts observed values in buckets of increasing upper bounds
+    """
+
+    def __init__(self, bounds: tuple = BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * len(bounds)
+
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """
+        Counts a value in every bucket it fits in
+        """
+
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.buckets[i] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self) -> dict:
+        return {"buckets": dict(zip(self.bounds, self.buckets)),
+                "count": self.count, "sum": self.sum}
+
+
+class TimedTokenizer(Tokenizer):
+    """
+    Tokenizer that keeps the number of tokens it produced and the time it
+    took. Tokens are produced as the parser asks for them, so this is the
+    only way to tell tokenizing apart from parsing.
+    """
+
+    def __init__(self, input: str, line: int = 1, col: int = 1):
+        super().__init__(input, line, col)
+
+        self.tokens = 0
+        self.elapsed = 0.0
+
+    def produce(self) -> Token:
+        start = time.perf_counter()
+        token = super().produce()
+
+        self.elapsed += time.perf_counter() - start
+        self.tokens += 1
+
+        return token
+
+
+class _CountingWriter(object):
+    """
+    Output sink that counts the bytes written to it before passing them on
+    """
+
+    def __init__(self, out: Any, metrics: "Metrics"):
+        self.out = out
+        self.metrics = metrics
+
+    def write(self, text: str) -> int:
+        self.metrics.say_bytes += len(text.encode())
+        return self.out.write(text)
+
+    def flush(self) -> None:
+        self.out.flush()
+
+
+class Metrics(object):
+    """
+    Counters and histograms for compiling and running programs. One set of
+    metrics can be shared by any number of compilations and executions,
+    adding up over all of them.
+    """
+
+    def __init__(self, count_nodes: bool = True):
+        """
+        Initializes empty metrics. Counting every node evaluated costs more
+        than everything else put together, so it can be left out.
+        """
+
+        self.count_nodes = count_nodes
+
+        # Maps the name of each class of node to the times one was evaluated.
+        # Nodes a quickened run specialized are counted under their own class.
+        self.nodes = Counter()
+
+        self.tokens = 0
+        self.process_calls = 0
+
+        # Most frames on the call stack at once, counting the main frame
+        self.call_depth_max = 0
+        self._depth = 0
+
+        self.arrays_allocated = 0
+        self.array_cells_allocated = 0
+
+        self.say_bytes = 0
+
+        # Maps each phase (tokenize, parse, optimize, execute) to a histogram
+        # of how long it took
+        self.phases = {}
+
+    def observe(self, phase: str, seconds: float) -> None:
+        """
+        Counts how long a phase took
+        """
+
+        if phase not in self.phases:
+            self.phases[phase] = Histogram()
+
+        self.phases[phase].observe(seconds)
+
+    def attach(self, interpreter: Any) -> None:
+        """
+        Starts counting the events of an interpreter that has not run yet
+        """
+
+        self._depth = 1
+        self.call_depth_max = max(self.call_depth_max, 1)
+
+        interpreter.out = _CountingWriter(interpreter.out, self)
+        interpreter.listen(self)
+
+        if self.count_nodes:
+            interpreter.count_nodes()
+
+    def finish(self, interpreter: Any, seconds: float) -> None:
+        """
+        Counts an interpreter's run once it is over, given how long it took
+        """
+
+        for cls, count in (interpreter.node_counts or {}).items():
+            self.nodes[cls.__name__] += count
+
+        self.observe("execute", seconds)
+
+    def on_call(self, proc: str, frame: Any) -> None:
+        self.process_calls += 1
+        self._depth += 1
+
+        if self._depth > self.call_depth_max:
+            self.call_depth_max = self._depth
+
+    def on_return(self, proc: str, value: Any) -> None:
+        self._depth -= 1
+
+    def on_array_alloc(self, size: int) -> None:
+        self.arrays_allocated += 1
+        self.array_cells_allocated += size
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Returns the metrics as plain values
+        """
+
+        return {
+            "nodes_evaluated"      : dict(self.nodes),
+            "tokens"               : self.tokens,
+            "process_calls"        : self.process_calls,
+            "call_depth_max"       : self.call_depth_max,
+            "arrays_allocated"     : self.arrays_allocated,
+            "array_cells_allocated": self.array_cells_allocated,
+            "say_bytes"            : self.say_bytes,
+            "phase_seconds"        : {phase: histogram.as_dict()
+                                      for phase, histogram in self.phases.items()}
+        }
+
+    def write(self, out: Any) -> None:
+        """
+        Writes the metrics in the OpenMetrics text format
+        """
+
+        def family(name: str, type: str, help: str) -> None:
+            print(f"# TYPE cou_{name} {type}", file=out)
+            print(f"# HELP cou_{name} {help}", file=out)
+
+        family("nodes_evaluated", "counter", "Nodes evaluated, by class of node")
+        for node, count in sorted(self.nodes.items()):
+            print(f'cou_nodes_evaluated_total{{node="{node}"}} {count}', file=out)
+
+        counters = (
+            ("tokens", self.tokens, "Tokens produced by the tokenizer"),
+            ("process_calls", self.process_calls, "Calls to processes declared in programs"),
+            ("arrays_allocated", self.arrays_allocated, "Arrays allocated"),
+            ("array_cells_allocated", self.array_cells_allocated, "Elements of the arrays allocated"),
+            ("say_bytes", self.say_bytes, "Bytes written by say")
+        )
+
+        for name, value, help in counters:
+            family(name, "counter", help)
+            print(f"cou_{name}_total {value}", file=out)
+
+        family("call_depth_max", "gauge", "Most frames on the call stack at once")
+        print(f"cou_call_depth_max {self.call_depth_max}", file=out)
+
+        family("phase_seconds", "histogram", "Time taken by each phase of compiling and running")
+        for phase, histogram in self.phases.items():
+            for bound, count in zip(histogram.bounds, histogram.buckets):
+                print(f'cou_phase_seconds_bucket{{phase="{phase}",le="{bound}"}} {count}', file=out)
+
+            print(f'cou_phase_seconds_bucket{{phase="{phase}",le="+Inf"}} {histogram.count}', file=out)
+            print(f'cou_phase_seconds_sum{{phase="{phase}"}} {histogram.sum}', file=out)
+            print(f'cou_phase_seconds_count{{phase="{phase}"}} {histogram.count}', file=out)
+
+        print("# EOF", file=out)
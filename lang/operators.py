@@ -0,0 +1,140 @@
+import operator
+
+from typing import Any
+
+import lang.token as tok
+
+from lang.array import FlatArray, SharedArray, SparseArray
+from lang.task import Task
+from lang.stream import File
+
+# Operator dispatch. Operators are looked up by their token type and the
+# python types of their operands, so that a single dictionary access both
+# checks that an operation is allowed and finds the function that does it.
+
+
+def cou_str(conv: Any) -> str:
+    """
+    Converts a value to its string representation in cou
+    """
+
+    if isinstance(conv, (FlatArray, SparseArray)):
+        conv = conv.tolist()
+
+    s_conv = str(conv)
+
+    if isinstance(conv, list):
+        n = len(conv)
+        s_conv = '['
+
+        for i, elem in enumerate(conv):
+            s_conv += f"{cou_str(elem)}"
+            if i < n - 1:
+                s_conv += ', '
+        s_conv += ']'
+
+    elif isinstance(conv, bool):
+        # Make it so that the string representation of booleans begin lower
+        s_conv = s_conv.lower()
+
+    elif isinstance(conv, type(None)):
+        # None -> nothing
+        s_conv = 'nothing'
+
+    elif isinstance(conv, Task):
+        s_conv = tok.TASK
+
+    elif isinstance(conv, File):
+        s_conv = f"{tok.FILE} '{conv.path}'"
+
+    return s_conv
+
+
+def _str_right(l: str, r: Any) -> str:
+    return l + cou_str(r)
+
+
+def _str_left(l: Any, r: str) -> str:
+    return cou_str(l) + r
+
+
+def _identity(operand: Any) -> Any:
+    return operand
+
+
+# Python types that hold the values of each cou type
+_types = {
+    tok.NUM : (int, float),
+    tok.BOOL: (bool,),
+    tok.STR : (str,),
+    tok.NIL : (type(None),),
+    tok.ARR : (list, FlatArray, SharedArray, SparseArray),
+    tok.TASK: (Task,),
+    tok.FILE: (File,)
+}
+
+_arithmetic = {
+    tok.ADD    : operator.add,
+    tok.SUB    : operator.sub,
+    tok.MUL    : operator.mul,
+    tok.DIV    : operator.truediv,
+    tok.MOD    : operator.mod,
+    tok.I_DIV  : operator.floordiv,
+    tok.GREATER: operator.gt,
+    tok.GEQ    : operator.ge,
+    tok.LESS   : operator.lt,
+    tok.LEQ    : operator.le
+}
+
+_logical = {
+    tok.AND: operator.and_,
+    tok.OR : operator.or_
+}
+
+_equality = {
+    tok.EQ : operator.eq,
+    tok.NEQ: operator.ne
+}
+
+# Maps (operator, left type, right type) to the function applying it
+binary = {}
+
+# Maps (operator, operand type) to the function applying it
+unary = {
+    (tok.ADD, int)  : operator.pos,
+    (tok.ADD, float): operator.pos,
+    (tok.SUB, int)  : operator.neg,
+    (tok.SUB, float): operator.neg,
+    (tok.NOT, bool) : operator.not_,
+    (tok.ADD, str)  : _identity
+}
+
+
+def _define(ops: dict, l_type: str, r_type: str) -> None:
+    """
+    Adds operators to the binary table for every pair of python types that
+    hold the given cou types
+    """
+
+    for op_type, function in ops.items():
+        for l in _types[l_type]:
+            for r in _types[r_type]:
+                binary[(op_type, l, r)] = function
+
+
+_define(_arithmetic, tok.NUM, tok.NUM)
+_define(_logical, tok.BOOL, tok.BOOL)
+
+for _cou_type in _types:
+    _define(_equality, _cou_type, _cou_type)
+
+    # Any value can be compared with nothing
+    _define(_equality, _cou_type, tok.NIL)
+    _define(_equality, tok.NIL, _cou_type)
+
+    # Anything added to a string is converted to one
+    if _cou_type != tok.STR:
+        _define({tok.ADD: _str_right}, tok.STR, _cou_type)
+        _define({tok.ADD: _str_left}, _cou_type, tok.STR)
+
+_define({tok.ADD: operator.add}, tok.STR, tok.STR)
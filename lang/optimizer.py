@@ -0,0 +1,990 @@
+import copy
+
+from typing import Any, List
+
+import lang.token as tok
+
+from lang.tokenizer import Token
+from lang.interpreter import Interpreter
+from lang.error import error
+from lang.ast import *
+
+# Optimizer
+
+# Most nodes the body of a process can have and still be inlined
+INLINE_BUDGET = 32
+
+
+class Transformer(object):
+    """
+    Superclass for passes that rewrite the AST. Calls a method for each node
+    type (if one is defined), and replaces the node with whatever it returns.
+    Children are rewritten before their parents.
+    """
+
+    def transform(self, node: AST) -> AST:
+        """
+        Rewrites a node and its children
+        """
+
+        result = [node]
+
+        # The places of the nodes being rewritten, each with the places of
+        # its children left to rewrite. An explicit stack rather than
+        # recursion, so that deep trees do not run out of python stack.
+        stack = [(result, 0, None)]
+
+        while stack:
+            owner, key, children = stack[-1]
+
+            if children is None:
+                replacement = self._enter(owner[key])
+
+                if replacement is not None:
+                    owner[key] = replacement
+                    stack.pop()
+                    continue
+
+                children = self._children(owner[key])
+                stack[-1] = owner, key, children
+
+            child = next(children, None)
+
+            if child is None:
+                stack.pop()
+                owner[key] = self._leave(owner[key])
+
+            else:
+                stack.append(child + (None,))
+
+        return result[0]
+
+    def _enter(self, node: AST) -> AST:
+        """
+        Returns what to replace a node with before its children are
+        rewritten, leaving them as they are, or None to go on
+        """
+
+        return None
+
+    def _children(self, node: AST):
+        """
+        Yields the places of the children of a node to rewrite, each as a
+        container and a key into it
+        """
+
+        for field, child in vars(node).items():
+            if isinstance(child, AST):
+                yield vars(node), field
+
+            elif isinstance(child, list):
+                for i, elem in enumerate(child):
+                    if isinstance(elem, AST):
+                        yield child, i
+
+    def _leave(self, node: AST) -> AST:
+        """
+        Rewrites a node once its children have been
+        """
+
+        method = getattr(self, f"_{node.name()}", None)
+        return method(node) if method else node
+
+
+class ConstantFolder(Transformer):
+    """
+    Evaluates operators whose operands are all literals at compile time.
+    Operations that would fail are left for the interpreter to report.
+    """
+
+    _literals = (Number, String, Boolean, Nothing)
+
+    def __init__(self):
+        self._interpreter = Interpreter()
+
+    def _literal(self, pos: int, value: Any) -> AST:
+        """
+        Builds a literal node for a folded value
+        """
+
+        if isinstance(value, bool):
+            return Boolean(Token(tok.BOOLEAN, tok.BOOL_T if value else tok.BOOL_F, pos))
+
+        if isinstance(value, (int, float)):
+            return Number(Token(tok.NUMBER, value, pos))
+
+        if isinstance(value, str):
+            return String(Token(tok.STRING, value, pos))
+
+        return None
+
+    def _fold(self, node: AST, operands: List[AST]) -> AST:
+        """
+        Replaces node with its value if all operands are literals
+        """
+
+        if not all(isinstance(op, self._literals) for op in operands):
+            return node
+
+        try:
+            value = self._interpreter.visit(node)
+        except (SyntaxError, ArithmeticError):
+            return node
+
+        return self._literal(node.pos, value) or node
+
+    def _unary_operator(self, node: AST) -> AST:
+        return self._fold(node, [node.child])
+
+    def _binary_operator(self, node: AST) -> AST:
+        return self._fold(node, [node.left, node.right])
+
+    def _logical_operator(self, node: AST) -> AST:
+        # A literal left operand can decide the result on its own
+        if type(node.left) == Boolean and (node.left.value == tok.BOOL_T) == node.decides:
+            return node.left
+
+        return self._fold(node, [node.left, node.right])
+
+
+def _appended(node: AST) -> tuple:
+    """
+    Returns the variable and the appended operands of a statement of the form
+    's = s + a + b ...' on a str variable, or None for any other statement
+    """
+
+    left = node.left
+    if type(left) != Variable or left.var_type != tok.STR:
+        return None
+
+    parts = []
+    expr = node.right
+
+    while isinstance(expr, BinaryOperator) and expr.value == tok.ADD:
+        parts.append(expr.right)
+        expr = expr.left
+
+        if type(expr) == Variable and expr.value == left.value and expr.depth == left.depth:
+            parts.reverse()
+            return expr, parts
+
+    return None
+
+
+def _refers(node: AST, key: tuple) -> bool:
+    """
+    Returns true if a node refers to the variable with a name and depth
+    """
+
+    if type(node) == Variable:
+        return (node.value, node.depth) == key
+
+    if isinstance(node, ArrayElement):
+        return (node.arr_name, node.depth) == key
+
+    return False
+
+
+def _reachable(node: AST, seen: set):
+    """
+    Yields the nodes below a node, along with the nodes of every process
+    that can be called from them
+    """
+
+    # Blocks of the processes called, left to go through once the nodes
+    # calling them have, so that long chains of calls do not recurse
+    blocks = [node]
+
+    while blocks:
+        for child in walk(blocks.pop()):
+            yield child
+
+            if isinstance(child, ProcessCall) and not child.proc_sym.is_builtin:
+                process = child.proc_sym.process
+
+                if process not in seen:
+                    seen.add(process)
+                    blocks.append(process.block)
+
+
+def _suspends(nodes: List[AST]) -> bool:
+    """
+    Returns true if any of some nodes can wait, letting other tasks run
+    """
+
+    for child in nodes:
+        if isinstance(child, (Spawn, Await)) or \
+                (isinstance(child, ProcessCall) and child.proc_sym.is_builtin
+                 and child.proc_sym.async_call):
+            return True
+
+    return False
+
+
+class Inliner(Transformer):
+    """
+    Replaces calls to small processes that cannot call themselves with a
+    copy of the process's body, which runs in the caller's frame. The
+    variables of the process are renamed in the copy to names no program can
+    use, so they cannot clash with the caller's. Processes that declare
+    processes, wait, open files or have 'par as' loops are not inlined, and
+    neither are spawned calls.
+    """
+
+    def __init__(self):
+        # Levels of the frames of the processes being rewritten
+        self._depths = [1]
+
+        # Maps each process to whether it can be inlined
+        self._inlinable = {}
+        self._inlined = 0
+
+    def _enter(self, node: AST) -> AST:
+        if isinstance(node, Process):
+            self._depths.append(node.declr.depth)
+
+        return None
+
+    def _children(self, node: AST):
+        if isinstance(node, Spawn):
+            # A spawned call runs as a task, in a frame of its own
+            args = node.call.args
+            return ((args, i) for i in range(len(args)))
+
+        return super()._children(node)
+
+    def _leave(self, node: AST) -> AST:
+        node = super()._leave(node)
+
+        if isinstance(node, Process):
+            self._depths.pop()
+
+        return node
+
+    def _process_call(self, node: AST) -> AST:
+        proc_sym = node.proc_sym
+
+        if proc_sym.is_builtin:
+            return node
+
+        process = proc_sym.process
+
+        if process not in self._inlinable:
+            self._inlinable[process] = self._can_inline(process)
+
+        return self._inline(node, process) if self._inlinable[process] else node
+
+    def _can_inline(self, process: AST) -> bool:
+        """
+        Returns true if calls to a process can be replaced with its body
+        """
+
+        nodes = list(walk(process.block))
+
+        if len(nodes) > INLINE_BUDGET or _suspends(nodes):
+            return False
+
+        for child in nodes:
+            if isinstance(child, Process) or (isinstance(child, As) and child.parallel):
+                return False
+
+            # Files are closed along with the frame of the process they are opened in
+            if isinstance(child, ProcessCall) and child.proc_sym.type_def == tok.FILE or \
+                    isinstance(child, InlinedCall) and child.type_def == tok.FILE:
+                return False
+
+        for child in _reachable(process.block, set()):
+            if isinstance(child, ProcessCall) and child.proc_sym.process is process:
+                return False
+
+        return True
+
+    def _inline(self, node: AST, process: AST) -> AST:
+        """
+        Returns an inlined call replacing a call to a process
+        """
+
+        depth = process.declr.depth
+        self._inlined += 1
+
+        names = {}
+
+        def rename(name: str) -> str:
+            return names.setdefault(name, f"{name}.{process.value}.{self._inlined}")
+
+        # Processes called from the body are shared with the copy, not copied
+        memo = {id(child.proc_sym): child.proc_sym
+                for child in walk(process.block) if isinstance(child, ProcessCall)}
+
+        block = copy.deepcopy(process.block, memo)
+        renamed = set()
+
+        for child in walk(block):
+            if id(child) in renamed:
+                continue
+
+            renamed.add(id(child))
+
+            if isinstance(child, (Variable, VariableDeclaration)) and child.depth == depth:
+                child.value = rename(child.value)
+                child.depth = self._depths[-1]
+
+            elif isinstance(child, ArrayElement) and child.depth == depth:
+                child.arr_name = rename(child.arr_name)
+                child.depth = self._depths[-1]
+
+            elif isinstance(child, InlinedCall):
+                child.params = [rename(name) for name in child.params]
+
+        return InlinedCall(node, [rename(param.value) for param in process.declr.params], block)
+
+
+class _Appends(Transformer):
+    """
+    Turns the appends to some str variables into StrAppend nodes, taking
+    over the buffers of any loops inside that already build them up
+    """
+
+    def __init__(self, keys: set):
+        self.keys = keys
+
+    def _assignment_statement(self, node: AST) -> AST:
+        appended = _appended(node)
+
+        if appended and (node.left.value, node.left.depth) in self.keys:
+            return StrAppend(node.pos, node.left, appended[1])
+
+        return node
+
+    def _str_buffer(self, node: AST) -> AST:
+        node.variables = [var for var in node.variables
+                          if (var.value, var.depth) not in self.keys]
+
+        return node if node.variables else node.loop
+
+
+class StringBuilder(Transformer):
+    """
+    Rewrites 'as' loops that build up a str variable with 's = s + ...' so
+    that the pieces go into a buffer that is joined once the loop finishes,
+    rather than copying the whole string on every iteration. A variable is
+    only buffered if nothing else can read it while the loop runs, either in
+    the loop itself or in a process it calls.
+    """
+
+    def _as(self, node: AST) -> AST:
+        if node.parallel:
+            return node
+
+        # Variables appended to, and the nodes that refer to them by doing so
+        appends = {}
+
+        for child in walk(node):
+            if isinstance(child, AssignmentStatement):
+                appended = _appended(child)
+
+                if appended:
+                    key = (child.left.value, child.left.depth)
+                    appends.setdefault(key, set()).update((id(child.left), id(appended[0])))
+
+            elif isinstance(child, StrAppend):
+                key = (child.variable.value, child.variable.depth)
+                appends.setdefault(key, set()).add(id(child.variable))
+
+            elif isinstance(child, StrBuffer):
+                for var in child.variables:
+                    appends.setdefault((var.value, var.depth), set()).add(id(var))
+
+        if not appends:
+            return node
+
+        nodes = list(_reachable(node, set()))
+
+        # Other tasks could read a variable while the loop waits
+        if _suspends(nodes):
+            return node
+
+        keys = {key for key, allowed in appends.items()
+                if all(id(child) in allowed for child in nodes if _refers(child, key))}
+
+        if not keys:
+            return node
+
+        loop = _Appends(keys).transform(node)
+        variables = [Variable(Token(tok.ID, name, node.pos), tok.STR, depth)
+                     for name, depth in sorted(keys)]
+
+        return StrBuffer(loop, variables)
+
+
+def _operands(node: AST) -> List[AST]:
+    """
+    Returns the nodes a pure expression is computed from
+    """
+
+    if type(node) == ArrayElement:
+        return node.indices
+
+    if type(node) in (BinaryOperator, LogicalOperator):
+        return [node.left, node.right]
+
+    if type(node) == UnaryOperator:
+        return [node.child]
+
+    return []
+
+
+def _expression(node: AST, known: dict = None, keys: dict = None) -> tuple:
+    """
+    Returns what a pure expression computes, as a key equal for every copy
+    of the expression, along with the variables it reads and whether it
+    reads the contents of arrays. Returns None for any other node. What the
+    nodes below it compute is kept in known, by their ids, and the number
+    standing for each key in keys.
+    """
+
+    known = {} if known is None else known
+    keys = {} if keys is None else keys
+
+    # Operands are worked out before the expressions made of them, with an
+    # explicit stack so that deep expressions do not run out of python stack
+    stack = [node]
+
+    while stack:
+        top = stack[-1]
+        pending = [op for op in _operands(top) if id(op) not in known]
+
+        if pending:
+            stack.extend(pending)
+            continue
+
+        stack.pop()
+        computed = _computes(top, [known[id(op)] for op in _operands(top)])
+
+        # Keys are made of the numbers standing for the keys of operands, so
+        # they stay as quick to compare however deep an expression is
+        if computed is not None:
+            computed = (keys.setdefault(computed[0], len(keys)),) + computed[1:]
+
+        known[id(top)] = computed
+
+    return known[id(node)]
+
+
+def _computes(node: AST, parts: List[tuple]) -> tuple:
+    """
+    Returns what a pure expression computes, given what its operands do
+    """
+
+    if isinstance(node, (Number, String, Boolean, Nothing)):
+        return (type(node), type(node.value), node.value), frozenset(), False
+
+    if type(node) == Variable:
+        var = (node.value, node.depth)
+
+        # Arrays compare by their contents
+        return (Variable,) + var, frozenset([var]), node.var_type in (tok.ARR, None)
+
+    if None in parts:
+        return None
+
+    if type(node) == ArrayElement:
+        var = (node.arr_name, node.depth)
+
+        reads = frozenset([var]).union(*(part[1] for part in parts))
+        return (ArrayElement, var) + tuple(part[0] for part in parts), reads, True
+
+    if type(node) not in (BinaryOperator, LogicalOperator, UnaryOperator):
+        return None
+
+    return ((type(node), node.value) + tuple(part[0] for part in parts),
+            frozenset().union(*(part[1] for part in parts)),
+            any(part[2] for part in parts))
+
+
+def _clobbers(node: AST) -> bool:
+    """
+    Returns true if a node can change variables and arrays it does not
+    name, by calling a process or letting other tasks run
+    """
+
+    if isinstance(node, ProcessCall):
+        return not node.proc_sym.is_builtin or bool(node.proc_sym.async_call)
+
+    return isinstance(node, (InlinedCall, Spawn, Await))
+
+
+class SubexpressionEliminator(object):
+    """
+    Evaluates pure expressions that are repeated along a run of statements
+    once, keeping the value in a variable of the frame for the copies that
+    come after to read. A value is only reused while nothing can have
+    changed a variable the expression reads, or the contents of an array if
+    it reads any. Copies that may not run, in the right operand of '&&' and
+    '||', a condition after the first of an 'if' or the value of a top level
+    declaration that can be injected, reuse values but do not keep them.
+    """
+
+    def transform(self, node: AST) -> AST:
+        # Maps copies of expressions to the first copy they reuse the value
+        # of, and first copies to the name and level of the variable their
+        # value is kept in
+        self._reused = {}
+        self._kept = {}
+
+        # Maps the key of each expression whose value can be reused to its
+        # first copy, the variables it reads and whether it reads arrays
+        self._available = {}
+
+        # What the expressions gone through compute, by their ids, and the
+        # numbers standing for their keys
+        self._known = {}
+        self._keys = {}
+
+        self._depths = [1]
+        self._statements(node.statements, injectable=True)
+
+        return _Share(self._reused, self._kept).transform(node)
+
+    def _statements(self, statements: List[AST], injectable: bool = False) -> None:
+        """
+        Shares the expressions along a run of statements, which starts with
+        no values available
+        """
+
+        outer = self._available
+        self._available = {}
+
+        for statement in statements:
+            self._statement(statement, injectable and isinstance(statement, AssignmentStatement)
+                            and type(statement.left) == VariableDeclaration)
+
+        self._available = outer
+
+    def _statement(self, node: AST, injectable: bool) -> None:
+        if isinstance(node, AssignmentStatement):
+            self._visit(node.right, injectable)
+            self._assign(node.left.value, node.left.depth)
+
+        elif isinstance(node, VariableDeclaration):
+            self._assign(node.value, node.depth)
+
+        elif isinstance(node, ArrayElementAssignment):
+            for index in node.left.indices:
+                self._visit(index)
+
+            self._visit(node.right)
+            self._assign_element()
+
+        elif isinstance(node, StrAppend):
+            for part in node.parts:
+                self._visit(part)
+
+            self._assign(node.variable.value, node.variable.depth)
+
+        elif isinstance(node, Say):
+            self._visit(node.value)
+
+        elif isinstance(node, Return):
+            self._visit(node.statement)
+
+        elif isinstance(node, Conditions):
+            for i, cond in enumerate(node.conditions):
+                self._visit(cond.condition, i > 0)
+
+            for cond in node.conditions:
+                self._statements(cond.block.statements)
+
+            self._effects(node)
+
+        elif isinstance(node, (As, StrBuffer)):
+            loop = node.loop if isinstance(node, StrBuffer) else node
+
+            # The iterations of 'par as' loops run in other processes
+            if not loop.parallel:
+                self._statements(loop.block.statements)
+
+            self._effects(node)
+
+        elif isinstance(node, Block):
+            self._statements(node.statements)
+            self._effects(node)
+
+        elif isinstance(node, Process):
+            self._depths.append(node.declr.depth)
+            self._statements(node.block.statements)
+            self._depths.pop()
+
+        else:
+            self._visit(node)
+
+    def _visit(self, node: AST, conditional: bool = False) -> None:
+        """
+        Goes through an expression in the order it is evaluated, reusing the
+        values of the copies of expressions evaluated before
+        """
+
+        # Nodes left to go through, the next one last, each with whether it
+        # may not run and, once its operands are on the stack above it, what
+        # it computes. Deep expressions would run out of python stack if
+        # this recursed.
+        stack = [(node, conditional, False, None)]
+
+        while stack:
+            node, conditional, entered, expression = stack.pop()
+
+            if entered:
+                self._evaluated(node, conditional, expression)
+                continue
+
+            if type(node) in (ArrayElement, BinaryOperator, LogicalOperator, UnaryOperator):
+                expression = _expression(node, self._known, self._keys)
+
+            if expression and expression[0] in self._available:
+                first, depth = self._available[expression[0]][0], self._depths[-1]
+
+                self._reused[id(node)] = first
+                self._kept.setdefault(id(first), (f"shared.{len(self._kept)}", depth))
+                continue
+
+            stack.append((node, conditional, True, expression))
+
+            if isinstance(node, BinaryOperator):
+                operands = [(node.left, conditional),
+                            (node.right, conditional or isinstance(node, LogicalOperator))]
+
+            elif isinstance(node, UnaryOperator):
+                operands = [(node.child, conditional)]
+
+            elif isinstance(node, ArrayElement):
+                operands = [(index, conditional) for index in node.indices]
+
+            elif isinstance(node, ArrayInitialization):
+                operands = [(size, conditional) for size in node.sizes]
+
+            elif isinstance(node, (ProcessCall, InlinedCall)):
+                operands = [(arg, conditional) for arg in node.args]
+
+            elif isinstance(node, Spawn):
+                operands = [(arg, conditional) for arg in node.call.args]
+
+            elif isinstance(node, Await):
+                operands = [(node.child, conditional)]
+
+            else:
+                operands = []
+
+                if not isinstance(node, (Number, String, Boolean, Nothing, Variable, Empty)):
+                    self._available.clear()
+
+            stack.extend((operand, cond, False, None) for operand, cond in reversed(operands))
+
+    def _evaluated(self, node: AST, conditional: bool, expression: tuple) -> None:
+        """
+        Records what evaluating an expression does, once its operands have
+        been gone through
+        """
+
+        if isinstance(node, InlinedCall):
+            self._statements(node.block.statements)
+
+        if _clobbers(node):
+            self._available.clear()
+
+        if expression and not conditional:
+            self._available[expression[0]] = (node,) + expression[1:]
+
+    def _effects(self, node: AST) -> None:
+        """
+        Forgets the values a statement with blocks could change
+        """
+
+        for child in walk(node):
+            if isinstance(child, AssignmentStatement):
+                self._assign(child.left.value, child.left.depth)
+
+            elif isinstance(child, VariableDeclaration):
+                self._assign(child.value, child.depth)
+
+            elif isinstance(child, StrAppend):
+                self._assign(child.variable.value, child.variable.depth)
+
+            elif isinstance(child, ArrayElementAssignment):
+                self._assign_element()
+
+            elif _clobbers(child):
+                self._available.clear()
+
+    def _assign(self, name: str, depth: int) -> None:
+        """
+        Forgets the values of the expressions that read a variable
+        """
+
+        for key, (_, reads, _) in list(self._available.items()):
+            if (name, depth) in reads:
+                del self._available[key]
+
+    def _assign_element(self) -> None:
+        """
+        Forgets the values of the expressions that read array elements
+        """
+
+        for key, (_, _, arrays) in list(self._available.items()):
+            if arrays:
+                del self._available[key]
+
+
+class _Share(Transformer):
+    """
+    Keeps the values of the first copies of shared expressions, and has the
+    copies after them read the kept values instead
+    """
+
+    def __init__(self, reused: dict, kept: dict):
+        self.reused = reused
+        self.kept = kept
+
+    def _enter(self, node: AST) -> AST:
+        if id(node) in self.reused:
+            name, depth = self.kept[id(self.reused[id(node)])]
+            return Variable(Token(tok.ID, name, node.pos), None, depth)
+
+        return None
+
+    def _leave(self, node: AST) -> AST:
+        kept = self.kept.get(id(node))
+        node = super()._leave(node)
+
+        return SharedExpression(node, *kept) if kept else node
+
+
+def _key(node: AST) -> tuple:
+    """
+    Returns the name and depth of a variable, or None for any other node
+    """
+
+    if type(node) == Variable:
+        return node.value, node.depth
+
+    return None
+
+
+def _whole(node: AST) -> bool:
+    """
+    Returns true if a node is a whole number literal no less than zero
+    """
+
+    return type(node) == Number and type(node.value) == int and node.value >= 0
+
+
+class BoundsChecker(Transformer):
+    """
+    Marks the elements of arrays indexed by the counter of an 'as' loop as
+    safe, where the counter cannot leave the array's bounds, so that the
+    interpreter can index them without checking. The counter has to start
+    at a whole number, go up by a whole number and be compared with '<'
+    against a bound no greater than the size the array was allocated with.
+    Neither the array nor the bound can be assigned anywhere else, and
+    nothing the loop runs can assign the counter.
+    """
+
+    def _program(self, node: AST) -> AST:
+        # Number of times each variable is assigned, anywhere in the program
+        self._assigned = {}
+
+        for child in walk(node):
+            if isinstance(child, AssignmentStatement):
+                key = (child.left.value, child.left.depth)
+                self._assigned[key] = self._assigned.get(key, 0) + 1
+
+        self._scan_all(node.statements, {})
+
+        # The body of an inlined call is only reached through the expression
+        # making the call
+        for child in walk(node):
+            if isinstance(child, InlinedCall):
+                self._scan_all(child.block.statements, {})
+
+        return node
+
+    def _bound(self, node: AST) -> Any:
+        """
+        Returns a whole number literal's value, or the key of a variable
+        assigned at most once, or None if a node is neither
+        """
+
+        if _whole(node):
+            return node.value
+
+        key = _key(node)
+
+        if key and self._assigned.get(key, 0) <= 1:
+            return key
+
+        return None
+
+    def _scan_all(self, statements: List[AST], sizes: dict) -> None:
+        """
+        Looks for loops in a list of statements, given the sizes of the
+        arrays allocated before it
+        """
+
+        sizes = dict(sizes)
+
+        for statement in statements:
+            self._scan(statement, sizes)
+
+    def _scan(self, node: AST, sizes: dict) -> None:
+        """
+        Looks for loops in a statement, recording the size of the array it
+        allocates if it does
+        """
+
+        if isinstance(node, AssignmentStatement):
+            key = (node.left.value, node.left.depth)
+
+            if type(node.left) == VariableDeclaration and self._assigned[key] == 1 and \
+                    type(node.right) == ArrayInitialization and len(node.right.sizes) == 1:
+                size = self._bound(node.right.sizes[0])
+
+                if size is not None:
+                    sizes[key] = size
+
+        elif isinstance(node, As):
+            self._check(node, sizes)
+            self._scan_all(node.block.statements, sizes)
+
+        elif isinstance(node, StrBuffer):
+            self._scan(node.loop, sizes)
+
+        elif isinstance(node, Conditions):
+            for cond in node.conditions:
+                self._scan_all(cond.block.statements, sizes)
+
+        elif isinstance(node, Block):
+            self._scan_all(node.statements, sizes)
+
+        elif isinstance(node, Process):
+            # A process runs in its own frame, whenever it is called
+            self._scan_all(node.block.statements, {})
+
+    def _counted(self, node: AST) -> tuple:
+        """
+        Returns the key of the counter of a loop and its bound, or None if
+        the loop does not count up from a whole number to a bound
+        """
+
+        declr = node.declr
+        counter = declr.counter
+        condition = declr.condition
+        after = declr.after
+
+        if not (isinstance(counter, AssignmentStatement) and
+                type(counter.left) == VariableDeclaration and _whole(counter.right)):
+            return None
+
+        key = (counter.left.value, counter.left.depth)
+
+        if not (type(condition) == BinaryOperator and condition.value == tok.LESS and
+                _key(condition.left) == key):
+            return None
+
+        if not (isinstance(after, AssignmentStatement) and _key(after.left) == key and
+                type(after.right) == BinaryOperator and after.right.value == tok.ADD and
+                _key(after.right.left) == key and _whole(after.right.right)):
+            return None
+
+        bound = self._bound(condition.right)
+        return None if bound is None else (key, bound)
+
+    def _check(self, node: AST, sizes: dict) -> None:
+        """
+        Marks the elements indexed by a loop's counter that stay in bounds
+        """
+
+        counted = self._counted(node)
+        if not counted:
+            return
+
+        key, bound = counted
+        nodes = list(_reachable(node.block, set()))
+
+        # Other tasks could change the counter while the loop waits
+        if _suspends(nodes):
+            return
+
+        for child in nodes:
+            if isinstance(child, AssignmentStatement) and \
+                    (child.left.value, child.left.depth) == key:
+                return
+
+        for child in self._local(node.block):
+            if type(child) == ArrayElement and len(child.indices) == 1 and \
+                    _key(child.indices[0]) == key:
+                size = sizes.get((child.arr_name, child.depth))
+
+                if size == bound or (type(size) == type(bound) == int and bound <= size):
+                    child.safe = True
+
+    def _local(self, node: AST):
+        """
+        Yields the nodes below a node, leaving out the processes it declares
+        """
+
+        stack = [node]
+
+        while stack:
+            node = stack.pop()
+            yield node
+
+            children = []
+
+            for child in vars(node).values():
+                if isinstance(child, AST):
+                    children.append(child)
+
+                elif isinstance(child, list):
+                    children.extend(elem for elem in child if isinstance(elem, AST))
+
+            stack.extend(child for child in reversed(children) if not isinstance(child, Process))
+
+
+def _overflowed_node(overflow: RecursionError) -> AST:
+    """
+    Returns the innermost node being gone through when python ran out of
+    stack, found from the frames the error unwound
+    """
+
+    deepest = None
+    tb = overflow.__traceback__
+
+    while tb is not None:
+        node = tb.tb_frame.f_locals.get("node")
+
+        if isinstance(node, AST) and hasattr(node, "pos"):
+            deepest = node
+
+        tb = tb.tb_next
+
+    return deepest
+
+
+# Passes run, in order, on an optimized program
+passes = [Inliner, ConstantFolder, StringBuilder, SubexpressionEliminator, BoundsChecker]
+
+
+def optimize(tree: AST) -> AST:
+    """
+    Runs all optimization passes over a tree
+    """
+
+    try:
+        for opt_pass in passes:
+            tree = opt_pass().transform(tree)
+
+    except RecursionError as overflow:
+        # The passes go through expressions without recursing, but not
+        # through every nesting of statements
+        error("Program is nested too deeply to optimize", _overflowed_node(overflow))
+
+    return tree
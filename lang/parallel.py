@@ -0,0 +1,177 @@
+import os
+import math
+import multiprocessing
+
+from typing import Any, Dict, List
+
+import lang.token as tok
+import lang.validation as validation
+
+from lang.error import error
+from lang.array import FlatArray, SharedArray, SparseArray, shape_of
+from lang.ast import AST, ArrayElementAssignment, VariableDeclaration, walk
+
+# Parallel 'as' loops
+
+# Number of processes a parallel loop is split across. Processes need to be
+# forked, so that they inherit the interpreter's state.
+workers = os.cpu_count() or 1
+
+# Where processes cannot be forked, loops run in place whatever workers is
+_forks = "fork" in multiprocessing.get_all_start_methods()
+
+# Loop being run by the worker processes of a pool
+_job = None
+
+# Set in worker processes, where nested parallel loops run in place
+_in_worker = False
+
+
+def _written_arrays(node: AST) -> List[str]:
+    """
+    Returns the names of the outer arrays written to by a loop
+    """
+
+    declared = {child.value for child in walk(node.block)
+                if isinstance(child, VariableDeclaration)}
+
+    names = []
+    for child in walk(node.block):
+        if isinstance(child, ArrayElementAssignment):
+            name = child.left.arr_name
+
+            if name not in declared and name not in names:
+                names.append(name)
+
+    return names
+
+
+def _iterations(interpreter: Any, node: AST) -> range:
+    """
+    Returns the values the counter of a loop takes, given that it has been
+    initialized
+    """
+
+    record = interpreter.stack.peek()
+
+    condition = node.declr.condition
+    start = record[condition.left.value]
+    step = node.declr.after.right.right.value
+
+    # Evaluated once as a whole so that type errors match a sequential loop
+    validation.validate_condition(node.pos, interpreter.visit(condition))
+    bound = interpreter.visit(condition.right)
+
+    if type(start) != int:
+        error("The counter of a 'par as' loop must start at an integer", node.pos)
+
+    if condition.value == tok.LESS:
+        stop = math.ceil(bound)
+    else:
+        stop = math.floor(bound) + 1
+
+    return range(start, max(start, stop), step)
+
+
+def _run_range(interpreter: Any, node: AST, arrays: Dict[str, SharedArray],
+               start: int, stop: int, step: int) -> None:
+    """
+    Runs some iterations of a loop, with the arrays it writes to replaced by
+    their shared copies
+    """
+
+    record = interpreter.stack.peek()
+    name = node.declr.counter.left.value
+
+    saved = {arr_name: record[arr_name] for arr_name in arrays}
+
+    for arr_name, shared in arrays.items():
+        record[arr_name] = shared
+
+    try:
+        for i in range(start, stop, step):
+            record[name] = i
+            interpreter.visit(node.block)
+
+    finally:
+        for arr_name, arr in saved.items():
+            record[arr_name] = arr
+
+
+def _enter_worker() -> None:
+    global _in_worker
+    _in_worker = True
+
+
+def _work(chunk: tuple) -> None:
+    interpreter, node, arrays = _job
+    _run_range(interpreter, node, arrays, *chunk)
+
+
+def _pool(n: int) -> Any:
+    """
+    Returns a pool of n processes that inherit the interpreter's state
+    """
+
+    return multiprocessing.get_context("fork").Pool(n, initializer=_enter_worker)
+
+
+def run(interpreter: Any, node: AST) -> None:
+    """
+    Runs a parallel 'as' loop whose counter has been initialized. The range
+    of the counter is split across worker processes, and the outer arrays
+    written by the loop are placed in shared memory so that the workers can
+    write to them in place.
+    """
+
+    global _job
+
+    record = interpreter.stack.peek()
+    iterations = _iterations(interpreter, node)
+
+    arrays = {}
+    created = {}
+
+    try:
+        for arr_name in _written_arrays(node):
+            arr = record[arr_name]
+
+            if isinstance(arr, SharedArray):
+                # Already shared by an enclosing parallel loop
+                arrays[arr_name] = arr
+                continue
+
+            shape = shape_of(arr) if type(arr) in (list, FlatArray, SparseArray) else None
+            if shape is None:
+                error(f"Array '{arr_name}' written by a 'par as' loop must hold only "
+                      "num, bool and nothing, in rows of equal length", node.pos)
+
+            arrays[arr_name] = created[arr_name] = SharedArray.create(arr, shape, node.pos)
+
+        n = min(workers, len(iterations))
+
+        if n < 2 or _in_worker or not _forks:
+            _run_range(interpreter, node, arrays, iterations.start, iterations.stop, iterations.step)
+
+        else:
+            size = math.ceil(len(iterations) / (n * 4))
+            chunks = [iterations[i:i + size] for i in range(0, len(iterations), size)]
+
+            # Workers are forked with the loop already in place
+            _job = (interpreter, node, arrays)
+
+            try:
+                with _pool(n) as pool:
+                    pool.map(_work, [(c.start, c.stop, c.step) for c in chunks])
+            finally:
+                _job = None
+
+        for arr_name, shared in created.items():
+            shared.copy_to(record[arr_name])
+
+    finally:
+        for shared in created.values():
+            shared.buffer.release()
+
+    # Leave the counter as a sequential loop would
+    record[node.declr.counter.left.value] = iterations.start + len(iterations) * iterations.step
@@ -1,8 +1,9 @@
-from typing import List, Callable, Any
+from typing import List, Any
 
 import lang.token as tok
+import lang.builtins as builtins
 
-from lang.tokenizer import Tokenizer
+from lang.tokenizer import Token, Tokenizer
 from lang.error import error
 
 from lang.ast import *
@@ -10,6 +11,66 @@ from lang.symtab import *
 
 # Parser
 
+# Maps each binary operator to its binding power, which is greater the
+# more tightly it binds
+_binding_powers = {operator: power for power, operators in enumerate(tok.binary_operators, 1)
+                   for operator in operators}
+
+# Powers given to the open parentheses and prefix operators waiting on the
+# stack of an expression, which no binary operator reduces past
+_OPEN = 0
+_PREFIX = -1
+
+# Tokens that can come before an operand, applying to it or opening a
+# parenthesized expression
+_prefixes = tok.unary_operators | {tok.AWAIT, tok.L_PAREN}
+
+# Operators giving a bool whatever their operands
+_comparisons = (tok.EQ, tok.NEQ, tok.GEQ, tok.LEQ, tok.GREATER, tok.LESS)
+
+
+def _static_type(node: AST) -> str:
+    """
+    Returns the cou type an expression has whenever it is evaluated, or
+    None if that is only known once it is
+    """
+
+    if isinstance(node, (Number, Boolean, String, Nothing)):
+        return {Number: tok.NUM, Boolean: tok.BOOL, String: tok.STR, Nothing: tok.NIL}[type(node)]
+
+    if isinstance(node, ArrayInitialization):
+        return tok.ARR
+
+    if isinstance(node, Spawn):
+        return tok.TASK
+
+    if isinstance(node, Variable):
+        return node.var_type
+
+    if isinstance(node, ProcessCall):
+        return node.proc_sym.type_def
+
+    if isinstance(node, LogicalOperator) or \
+            isinstance(node, UnaryOperator) and node.value == tok.NOT:
+        return tok.BOOL
+
+    if isinstance(node, UnaryOperator):
+        return tok.NUM if _static_type(node.child) == tok.NUM else None
+
+    if isinstance(node, BinaryOperator):
+        if node.value in _comparisons:
+            return tok.BOOL
+
+        operand_types = (_static_type(node.left), _static_type(node.right))
+
+        if node.value == tok.ADD and tok.STR in operand_types:
+            return tok.STR
+
+        return tok.NUM if operand_types == (tok.NUM, tok.NUM) else None
+
+    return None
+
+
 
 class Parser:
     """
@@ -25,7 +86,20 @@ class Parser:
         self.curr = self._tokenizer.produce()
 
         # Stores types for variables (used for validation)
-        self.symtab = SymbolTable(1, "global", None)
+        self.symtab = SymbolTable()
+        builtins.declare(self.symtab)
+
+        # Whether the program being parsed has spawned a task so far
+        self.spawns = False
+
+    def reset(self, tokenizer: Tokenizer) -> None:
+        """
+        Points the parser at a new stream of tokens. The symbol table is kept,
+        so names declared by earlier input remain visible to the new input
+        """
+
+        self._tokenizer = tokenizer
+        self.curr = self._tokenizer.produce()
 
     def _consume(self, type: str) -> None:
         """
@@ -38,12 +112,11 @@ class Parser:
 
         self.curr = self._tokenizer.produce()
 
-    def _factor(self) -> AST:
+    def _primary(self) -> AST:
         """
-        Parses a factor
-            factor : number | bool | string | nothing | array_initialization
-                        | array_element | variable | process_call | (disjunction)
-                        | (add|sub) factor
+        Parses an operand that is not made of other operands
+            primary : number | bool | string | nothing | array_initialization
+                        | array_element | variable | process_call | spawn
         """
 
         operand_token = self.curr
@@ -80,96 +153,166 @@ class Parser:
             self._consume(operand_token.type)
             node = Boolean(operand_token)
 
-        elif operand_token.type in (tok.ADD, tok.SUB, tok.NOT):
-            self._consume(operand_token.type)
-            node = UnaryOperator(operand_token, self._factor())
-
-        elif operand_token.type == tok.L_PAREN:
-            self._consume(tok.L_PAREN)
-            node = self._disjunction()
-            self._consume(tok.R_PAREN)
+        elif operand_token.type == tok.SPAWN:
+            node = self._spawn()
 
         else:
             error(f"Invalid factor '{operand_token.value}'", operand_token)
 
         return node
 
-    def _parse_binop(self, func: Callable[[], AST], operator_types: List[str]) -> AST:
+    def _expression(self, min_power: int) -> AST:
         """
-        Utility method used to parse binary operators
+        Parses an expression by precedence climbing, stopping at a binary
+        operator outside of parentheses that binds less tightly than
+        min_power. Operators waiting for their operands and open parentheses
+        are kept on a stack of their own, so that nesting them does not
+        recurse.
+            expression : factor (binary_operator factor)*
+            factor : (add|sub|not|await)* (primary | lparen expression rparen)
         """
 
-        node = func()
-        operator = self.curr
+        # Left operands of the binary operators waiting, and the tokens of
+        # the operators and open parentheses waiting with their powers
+        operands = []
+        waiting = []
+        opened = 0
 
-        while operator.type in operator_types:
-            self._consume(operator.type)
-            node = BinaryOperator(node, operator, func())
-            operator = self.curr
+        prefixes = _prefixes
+        binding_powers = _binding_powers
 
-        return node
+        while True:
+            token = self.curr
+
+            while token.type in prefixes:
+                self._consume(token.type)
+
+                if token.type == tok.L_PAREN:
+                    waiting.append((token, _OPEN))
+                    opened += 1
+                else:
+                    waiting.append((token, _PREFIX))
+
+                token = self.curr
+
+            operand = self._primary()
+
+            while True:
+                # Prefix operators apply to the factor that was just parsed
+                while waiting and waiting[-1][1] == _PREFIX:
+                    operand = self._prefix(waiting.pop()[0], operand)
+
+                token = self.curr
+                power = binding_powers.get(token.type)
 
-    def _term(self) -> AST:
+                if power is not None and (opened or power >= min_power):
+                    break
+
+                if waiting and waiting[-1][1] > _OPEN:
+                    operand = self._reduce(operands, waiting, operand, _OPEN + 1)
+
+                if not opened:
+                    return operand
+
+                self._consume(tok.R_PAREN)
+
+                waiting.pop()
+                opened -= 1
+
+            # Operators that bind at least as tightly take this operand as
+            # their right one, before the new operator takes it as its left
+            if waiting and waiting[-1][1] >= power:
+                operand = self._reduce(operands, waiting, operand, power)
+
+            self._consume(token.type)
+
+            operands.append(operand)
+            waiting.append((token, power))
+
+    def _reduce(self, operands: List[AST], waiting: List[tuple], right: AST, power: int) -> AST:
         """
-        Parses a term
-            term : factor ((mul|div|idiv|mod) factor)*
+        Builds the binary operators on top of the stack that bind at least
+        as tightly as power, returning the operator built last
         """
 
-        return self._parse_binop(self._factor, (tok.MUL, tok.DIV, tok.I_DIV, tok.MOD))
+        while waiting and waiting[-1][1] >= power:
+            token = waiting.pop()[0]
+            left = operands.pop()
 
-    def _sum(self) -> AST:
+            if token.type in (tok.AND, tok.OR):
+                right = self._logical_operator(left, token, right)
+            else:
+                right = BinaryOperator(left, token, right)
+
+        return right
+
+    def _prefix(self, token: Token, operand: AST) -> AST:
         """
-        Parses a sum
-            term : term ((add|sub) term)*
+        Builds a prefix operator applied to its operand
         """
 
-        return self._parse_binop(self._term, (tok.ADD, tok.SUB))
+        if token.type == tok.AWAIT:
+            return Await(token, operand)
+
+        return UnaryOperator(token, operand)
 
-    def _comparison(self) -> AST:
+    def _logical_operator(self, left: AST, operator: Token, right: AST) -> AST:
         """
-        Parses a boolean comparison
-            comparison : sum ((eq|neq|geq|leq|greater|less) sum)*
+        Builds && or ||, checking both operands here since the right one
+        might never be evaluated
         """
 
-        return self._parse_binop(self._sum, (tok.EQ, tok.NEQ, tok.GEQ, tok.LEQ, tok.GREATER, tok.LESS))
+        for operand in (left, right):
+            operand_type = _static_type(operand)
 
-    def _conjunction(self) -> AST:
+            if operand_type not in (None, tok.BOOL):
+                error(f"Operand of {operator.type} cannot be '{operand_type}', must be 'bool'", operator)
+
+        return LogicalOperator(left, operator, right)
+
+    def _sum(self) -> AST:
         """
-        Parses a conjunction
-            conjunction : comparison (and comparison)*
+        Parses a sum, whose operators bind at least as tightly as + and -
         """
 
-        return self._parse_binop(self._comparison, tok.AND)
+        return self._expression(_binding_powers[tok.ADD])
 
     def _disjunction(self) -> AST:
         """
-        Parses a disjunction
-            conjunction : conjunction (or conjunction)*
+        Parses an expression made of any operators
         """
 
-        return self._parse_binop(self._conjunction, tok.OR)
+        return self._expression(0)
 
     def _array_element(self) -> AST:
         """
         Parses an array element
-            array_element : id (lbrack number rbrack)+
+            array_element : id (lbrack sum (comma sum)* rbrack)+
         """
 
         token = self.curr
         arr_name = token.value
 
-        if arr_name not in self.symtab:
+        symbol = self.symtab.lookup(arr_name)
+
+        if symbol is None:
             error(f"Array '{arr_name}' accessed before declaration", token)
 
+        depth = symbol.depth
         self._consume(tok.ID)
 
         indices = []
         while self.curr.type == tok.L_BRACK:
             self._consume(tok.L_BRACK)
             indices.append(self._sum())
+
+            while self.curr.type == tok.COMMA:
+                self._consume(tok.COMMA)
+                indices.append(self._sum())
+
             self._consume(tok.R_BRACK)
 
-        return ArrayElement(token, indices)
+        return ArrayElement(token, indices, depth)
 
     def _variable(self) -> AST:
         """
@@ -180,24 +323,25 @@ class Parser:
         token = self.curr
         var_name = token.value
 
-        if var_name not in self.symtab:
+        symbol = self.symtab.lookup(var_name)
+
+        if symbol is None:
             error(
                 f"Variable '{var_name}' referenced before declaration", token)
 
-        var_type = self.symtab[var_name].type_def
         self._consume(tok.ID)
 
-        return Variable(token, var_type)
+        return Variable(token, symbol.type_def, symbol.depth)
 
     def _variable_type(self) -> AST:
         """
         Parses a type
-            type : num | bool | str | nil | arr
+            type : num | bool | str | nil | arr | task | file
         """
 
         token = self.curr
 
-        if token.type not in (tok.NUM, tok.BOOL, tok.STR, tok.NIL, tok.ARR):
+        if token.type not in (tok.NUM, tok.BOOL, tok.STR, tok.NIL, tok.ARR, tok.TASK, tok.FILE):
             error(f"Invalid type definition: '{token.value}'", token)
 
         self._consume(token.type)
@@ -213,14 +357,14 @@ class Parser:
         token = self.curr
         var_name = token.value
 
-        if var_name in self.symtab:
+        if self.symtab.in_scope(var_name):
             error(f"Variable '{var_name}' declared more than once", token)
 
         self._consume(tok.ID)
         self._consume(tok.COLON)
 
         var_type = self._variable_type()
-        variable = Variable(token, var_type.value)
+        variable = Variable(token, var_type.value, self.symtab.depth)
 
         self.symtab[var_name] = VariableSymbol(var_name, var_type.value)
 
@@ -229,7 +373,7 @@ class Parser:
     def _array_initialization(self) -> AST:
         """
         Parses an array initialization
-            array : arr lbrack sum rbrack
+            array : arr lbrack sum (comma sum)* rbrack
         """
 
         token = self.curr
@@ -237,10 +381,15 @@ class Parser:
         self._consume(tok.ARR)
 
         self._consume(tok.L_BRACK)
-        arr = ArrayInitialization(token, self._sum())
+        sizes = [self._sum()]
+
+        while self.curr.type == tok.COMMA:
+            self._consume(tok.COMMA)
+            sizes.append(self._sum())
+
         self._consume(tok.R_BRACK)
 
-        return arr
+        return ArrayInitialization(token, sizes)
 
     def _assignment_statement(self) -> AST:
         """
@@ -283,8 +432,6 @@ class Parser:
         token = self.curr
         conditions = []
 
-        scope_level = self.symtab.sc_level + 1
-
         self._consume(tok.IF)
 
         self._consume(tok.L_PAREN)
@@ -292,9 +439,9 @@ class Parser:
         self._consume(tok.R_PAREN)
 
         # Shifting the scope of the symbol table to the conditional level
-        self.symtab = SymbolTable(scope_level, "if", self.symtab)
+        self.symtab.push("if")
         conditions.append(Condition(condition, self._block()))
-        self.symtab = self.symtab.sc_enclosing
+        self.symtab.pop()
 
         while self.curr.type == tok.ELIF:
             self._consume(tok.ELIF)
@@ -303,9 +450,9 @@ class Parser:
             condition = self._disjunction()
             self._consume(tok.R_PAREN)
 
-            self.symtab = SymbolTable(scope_level, "elif", self.symtab)
+            self.symtab.push("elif")
             conditions.append(Condition(condition, self._block()))
-            self.symtab = self.symtab.sc_enclosing
+            self.symtab.pop()
 
         if self.curr.type == tok.ELSE:
             # Use this to always eval True for else during interpretation
@@ -315,9 +462,9 @@ class Parser:
 
             self._consume(tok.ELSE)
 
-            self.symtab = SymbolTable(scope_level, "else", self.symtab)
+            self.symtab.push("else")
             conditions.append(Condition(else_cond, self._block()))
-            self.symtab = self.symtab.sc_enclosing
+            self.symtab.pop()
 
         return Conditions(conditions)
 
@@ -359,12 +506,96 @@ class Parser:
         token = self.curr
         self._consume(tok.AS)
 
-        self.symtab = SymbolTable(self.symtab.sc_level + 1, "as", self.symtab)
+        self.symtab.push("as")
         as_node = As(token, self._as_declaration(), self._block())
-        self.symtab = self.symtab.sc_enclosing
+        self.symtab.pop()
+
+        return as_node
+
+    def _par(self) -> AST:
+        """
+        Parses a parallel 'as' block, whose iterations may run at the same time
+            par : par as
+        """
+
+        self._consume(tok.PAR)
+
+        as_node = self._as()
+        as_node.parallel = True
+
+        self._validate_parallel(as_node)
 
         return as_node
 
+    def _validate_parallel(self, node: AST) -> None:
+        """
+        Checks that the iterations of a parallel 'as' block are independent.
+        The loop must count up in constant steps over a range that is fixed
+        when the loop starts, and its body may only write to its own
+        variables and to array elements. Elements of its own arrays can only
+        be written if the arrays were made in the loop, since otherwise they
+        could be parts of outer arrays that are not shared with the workers.
+        """
+
+        counter = node.declr.counter
+        condition = node.declr.condition
+        after = node.declr.after
+
+        if not counter or not isinstance(counter.left, VariableDeclaration):
+            error("A 'par as' loop must declare its counter", node.pos)
+
+        name = counter.left.value
+
+        if not (isinstance(condition, BinaryOperator) and condition.value in (tok.LESS, tok.LEQ)
+                and isinstance(condition.left, Variable) and condition.left.value == name):
+            error(f"A 'par as' condition must be '{name} < bound' or '{name} <= bound'", node.pos)
+
+        if not (after and after.left.value == name and isinstance(after.right, BinaryOperator)
+                and after.right.value == tok.ADD and isinstance(after.right.left, Variable)
+                and after.right.left.value == name and isinstance(after.right.right, Number)
+                and type(after.right.right.value) == int and after.right.right.value > 0):
+            error(f"A 'par as' loop must step with '{name} = {name} + step'", node.pos)
+
+        for bound in (counter.right, condition.right):
+            for child in walk(bound):
+                if isinstance(child, (ArrayElement, ProcessCall)):
+                    error("The range of a 'par as' loop cannot depend on arrays or processes", child.pos)
+
+        declared = {child.value for child in walk(node.block) if isinstance(child, VariableDeclaration)}
+
+        for child in walk(node.block):
+            if isinstance(child, Say):
+                error("A 'par as' loop cannot say", child.pos)
+
+            elif isinstance(child, (ProcessCall, Process, Return)):
+                error("A 'par as' loop cannot call, declare or return from processes", node.pos)
+
+            elif isinstance(child, AssignmentStatement) and child.left.value == name:
+                error(f"A 'par as' loop cannot assign to its counter '{name}'", child.pos)
+
+            elif isinstance(child, AssignmentStatement) and child.left.value not in declared:
+                error(f"A 'par as' loop cannot assign to outer variable '{child.left.value}'", child.pos)
+
+        # Number of dimensions of each array the loop makes, or None for its
+        # own variables that are ever given any other value
+        made = {}
+
+        for child in walk(node.block):
+            if isinstance(child, AssignmentStatement) and child.left.value in declared:
+                dims = len(child.right.sizes) if isinstance(child.right, ArrayInitialization) else None
+                prev = made.get(child.left.value, dims)
+
+                made[child.left.value] = None if None in (prev, dims) else min(prev, dims)
+
+        for child in walk(node.block):
+            if isinstance(child, ArrayElementAssignment) and child.left.arr_name in declared:
+                arr_name = child.left.arr_name
+                dims = made.get(arr_name)
+
+                if dims is None or len(child.left.indices) > dims:
+                    error(f"A 'par as' loop cannot write through '{arr_name}', which may share "
+                          "elements with an outer array", child.pos)
+
     def _process_declaration(self) -> AST:
         """
         Parses a process declaration
@@ -374,7 +605,7 @@ class Parser:
         token = self.curr
         proc_name = token.value
 
-        if proc_name in self.symtab:
+        if self.symtab.in_scope(proc_name):
             error(f"Name '{proc_name}' declared more than once", token)
 
         self._consume(tok.ID)
@@ -386,8 +617,7 @@ class Parser:
         self._consume(tok.L_PAREN)
 
         # Shifting the scope of the symbol table to the processes level
-        prev_tab = self.symtab
-        self.symtab = SymbolTable(prev_tab.sc_level + 1, proc_name, prev_tab)
+        self.symtab.push(proc_name, frame=True)
 
         if self.curr.type != tok.R_PAREN:
             params.append(self._variable_declaration())
@@ -396,12 +626,12 @@ class Parser:
             self._consume(tok.COMMA)
             params.append(self._variable_declaration())
 
-        prev_tab[proc_name] = ProcessSymbol(
-            proc_name, proc_type.value, self.symtab.sc_level, params)
+        self.symtab.declare_enclosing(proc_name, ProcessSymbol(
+            proc_name, proc_type.value, self.symtab.depth, params))
 
         self._consume(tok.R_PAREN)
 
-        return ProcessDeclaration(token, proc_type, params)
+        return ProcessDeclaration(token, proc_type, params, self.symtab.depth)
 
     def _process(self) -> AST:
         """
@@ -415,7 +645,7 @@ class Parser:
         proc_name = proc_dec.value
 
         block = self._block()
-        self.symtab = self.symtab.sc_enclosing
+        self.symtab.pop()
 
         process = Process(proc_dec, block)
 
@@ -433,10 +663,11 @@ class Parser:
         token = self.curr
         proc_name = token.value
 
-        if proc_name not in self.symtab:
+        st_entry = self.symtab.lookup(proc_name)
+
+        if st_entry is None:
             error(f"Process {proc_name} not defined in current scope", token)
 
-        st_entry = self.symtab[proc_name]
 
         if not st_entry.is_proc:
             error(f"Identifier {proc_name} does not refer to a process", token)
@@ -461,18 +692,34 @@ class Parser:
 
         return ProcessCall(token, args, st_entry)
 
+    def _spawn(self) -> AST:
+        """
+        Parses a process call that is started as a task
+            spawn : spawn process_call
+        """
+
+        token = self.curr
+        self._consume(tok.SPAWN)
+
+        if self.curr.type != tok.ID or self._tokenizer.peek() != tok.L_PAREN:
+            error("Expected a process call after 'spawn'", self.curr)
+
+        self.spawns = True
+        return Spawn(token, self._process_call())
+
     def _return(self) -> AST:
         """
         Parses a return statement
             return : return [disjunction | empty] sep
         """
 
+        token = self.curr
         self._consume(tok.RETURN)
 
         if (self.curr.value == tok.SEP):
-            return Return(Empty())
+            return Return(token, Empty(self.curr))
 
-        return Return(self._disjunction())
+        return Return(token, self._disjunction())
 
     def _say(self) -> AST:
         """
@@ -491,7 +738,7 @@ class Parser:
             empty :
         """
 
-        return Empty()
+        return Empty(self.curr)
 
     def _block(self) -> AST:
         """
@@ -512,7 +759,7 @@ class Parser:
     def _statement(self) -> AST:
         """
         Parses a statement
-            statement : process | conditions | as
+            statement : process | conditions | as | par
                             | [ process_call | assignment_statement | say
                                     | return | empty | disjunction
                               ] sep
@@ -530,6 +777,9 @@ class Parser:
         elif token.type == tok.AS:
             return self._as()
 
+        elif token.type == tok.PAR:
+            return self._par()
+
         if token.type == tok.ID and next_char == tok.L_PAREN:
             # Call for a process
             stmt = self._process_call()
@@ -560,17 +810,24 @@ class Parser:
             program : statement* eof
         """
 
+        self.spawns = False
+
         statements = []
         while self.curr.type != tok.EOF:
             statements.append(self._statement())
 
         self._consume(tok.EOF)
 
-        return Program(statements)
+        return Program(statements, [self._tokenizer.source], self.spawns)
 
     def parse(self) -> AST:
         """
         Parses all valid expressions in grammar
         """
 
-        return self._program()
+        try:
+            return self._program()
+
+        except RecursionError:
+            # Each level of nesting takes several python frames to parse
+            error("Program is nested too deeply to parse", self.curr)
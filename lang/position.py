@@ -0,0 +1,119 @@
+import weakref
+
+from array import array
+from bisect import bisect_right
+from typing import Tuple
+
+# Source positions. Every text that is tokenized is added to one shared table,
+# laid end to end with the texts before it, so a single integer offset is
+# enough to find where a token came from. Lines and columns are only worked
+# out from an offset when an error needs them.
+#
+# The table only holds its sources weakly. The program node at the root of a
+# tree keeps the sources of its positions, so a source is dropped along with
+# the last tree that uses it.
+
+# Fewest sources the table holds before dropping the ones that are gone
+_PRUNE_AT = 64
+
+
+class Source(object):
+    """
+    Text added to the position table, along with the offsets its lines start
+    at and the line and column its first character is on
+    """
+
+    def __init__(self, base: int, text: str, line: int, col: int):
+        """
+        Initializes a source starting at base in the table
+        """
+
+        self.base = base
+        self.line = line
+        self.col = col
+
+        # Position just past the text, where the EOF token is
+        self.end = base + len(text) + 1
+
+        # Offsets, from the start of the text, of every line after the first
+        self.starts = array('q')
+
+        i = text.find('\n')
+        while i != -1:
+            self.starts.append(i + 1)
+            i = text.find('\n', i + 1)
+
+    def locate(self, offset: int) -> Tuple[int, int]:
+        """
+        Returns the line and column of an offset from the start of the text
+        """
+
+        n = bisect_right(self.starts, offset)
+
+        if not n:
+            return self.line, self.col + offset
+
+        return self.line + n, offset - self.starts[n - 1] + 1
+
+
+class PositionTable(object):
+    """
+    Table of the sources tokenized so far that are still in use. Positions
+    are never reused, so a position from a dropped source is not mistaken
+    for one from a later source.
+    """
+
+    def __init__(self):
+        # Bases of the sources, and references to them, replaced together
+        self._index = ([], [])
+
+        self._end = 0
+        self._prune_at = _PRUNE_AT
+
+    def add(self, text: str, line: int = 1, col: int = 1) -> Source:
+        """
+        Adds a text to the table, starting at a line and column
+        """
+
+        source = Source(self._end, text, line, col)
+        self._end = source.end
+
+        if len(self._index[1]) >= self._prune_at:
+            self._prune()
+
+        # The source goes in before its base, so that a lookup from another
+        # thread never finds a base without its source
+        bases, sources = self._index
+        sources.append(weakref.ref(source))
+        bases.append(source.base)
+
+        return source
+
+    def _prune(self) -> None:
+        """
+        Drops the sources that are no longer in use
+        """
+
+        bases, sources = self._index
+        kept = [i for i, ref in enumerate(sources) if ref() is not None]
+
+        self._index = ([bases[i] for i in kept], [sources[i] for i in kept])
+        self._prune_at = max(2 * len(kept), _PRUNE_AT)
+
+    def locate(self, pos: int) -> Tuple[int, int]:
+        """
+        Returns the line and column of a position, or line 0 and column 0 if
+        its source has been dropped
+        """
+
+        bases, sources = self._index
+        i = bisect_right(bases, pos) - 1
+        source = sources[i]() if i >= 0 else None
+
+        if source is None or pos >= source.end:
+            return 0, 0
+
+        return source.locate(pos - source.base)
+
+
+positions = PositionTable()
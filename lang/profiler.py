@@ -0,0 +1,90 @@
+import threading
+
+from collections import Counter
+from typing import Any
+
+from lang.error import where
+
+# Sampling profiler
+
+# Seconds between samples by default
+INTERVAL = 0.001
+
+
+class Profiler(object):
+    """
+    Samples the call stack of an interpreter from a timer thread, counting
+    how often each stack of processes, and the lines they were running, was
+    seen. Counts are written as collapsed stacks, one stack per line with its
+    frames separated by ';', which flamegraph tools read as they are.
+    """
+
+    def __init__(self, interpreter: Any, interval: float = INTERVAL):
+        """
+        Initializes a profiler for an interpreter that has not run yet
+        """
+
+        self.interpreter = interpreter
+        self.interval = interval
+
+        # Maps each stack seen to the number of samples it was seen in
+        self.stacks = Counter()
+
+        self._thread = None
+        self._stopped = threading.Event()
+
+        # Lines of the positions seen in samples
+        self._lines = {None: 0}
+
+        # Frames only know where they are while the interpreter tracks them.
+        # Positions are turned into lines here rather than as statements run.
+        interpreter.track_positions()
+
+    def _line(self, pos: int) -> int:
+        line = self._lines.get(pos)
+
+        if line is None:
+            line, _ = where(pos)
+            self._lines[pos] = line
+
+        return line
+
+    def sample(self) -> None:
+        """
+        Counts the stack the interpreter is in now
+        """
+
+        frames = [(frame.name, frame.pos) for frame in self.interpreter.stack.stack[:]]
+
+        if frames:
+            self.stacks[";".join(f"{name}:{self._line(pos)}" for name, pos in frames)] += 1
+
+    def _sample_until_stopped(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+    def start(self) -> None:
+        """
+        Starts sampling
+        """
+
+        self._stopped.clear()
+
+        self._thread = threading.Thread(target=self._sample_until_stopped, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+        Stops sampling, once the sample being taken is done
+        """
+
+        self._stopped.set()
+        self._thread.join()
+
+    def write(self, out: Any) -> None:
+        """
+        Writes the stacks seen as collapsed stacks, most frequent first
+        """
+
+        for stack, count in self.stacks.most_common():
+            print(f"{stack} {count}", file=out)
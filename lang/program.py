@@ -0,0 +1,159 @@
+import time
+
+from typing import Any
+
+from lang.error import error
+from lang.tokenizer import Tokenizer
+from lang.parser import Parser
+from lang.interpreter import Interpreter
+from lang.stackless import StacklessInterpreter, STACK_LIMIT
+from lang.scheduler import AsyncInterpreter
+from lang.quicken import QuickeningInterpreter
+from lang.metrics import Metrics, TimedTokenizer
+
+import lang.optimizer as optimizer
+from lang.ast import AST, AssignmentStatement, VariableDeclaration
+
+# Embedding API
+
+
+class CompiledProgram(object):
+    """
+    A program that has been parsed, checked and (optionally) optimized. Its
+    meaning is not changed by running it (quickened runs only specialize its
+    nodes), so it can be executed any number of times without going through
+    the tokenizer or parser again.
+    """
+
+    def __init__(self, tree: AST, optimized: bool = False):
+        """
+        Initializes a compiled program from its tree
+        """
+
+        self._tree = tree
+        self.optimized = optimized
+
+        # Types of the top level variables, which can be given initial values
+        self.variables = {
+            s.left.value: s.left.var_type for s in tree.statements
+            if isinstance(s, AssignmentStatement) and isinstance(s.left, VariableDeclaration)
+        }
+
+        # Programs that spawn tasks are run on an event loop
+        self.concurrent = tree.spawns
+
+    @property
+    def tree(self) -> AST:
+        return self._tree
+
+    def execution(self, out: Any = None, values: dict = None, stackless: bool = False,
+                  stack_limit: int = STACK_LIMIT, quicken: bool = False,
+                  metrics: Metrics = None) -> "Execution":
+        """
+        Creates a new execution of the program
+        """
+
+        return Execution(self, out, values, stackless, stack_limit, quicken, metrics)
+
+    def run(self, out: Any = None, values: dict = None, stackless: bool = False,
+            stack_limit: int = STACK_LIMIT, quicken: bool = False,
+            metrics: Metrics = None) -> None:
+        """
+        Runs the program once
+        """
+
+        self.execution(out, values, stackless, stack_limit, quicken, metrics).run()
+
+
+class Execution(object):
+    """
+    A single run of a compiled program. Each execution has its own call
+    stack and output sink, and can replace the initial values of top level
+    variables.
+    """
+
+    def __init__(self, program: CompiledProgram, out: Any = None, values: dict = None,
+                 stackless: bool = False, stack_limit: int = STACK_LIMIT, quicken: bool = False,
+                 metrics: Metrics = None):
+        """
+        Initializes an execution. Output from say is written to out (stdout
+        by default). A stackless execution keeps its frames on the heap
+        instead of the python stack, so recursion is only limited by
+        stack_limit. A quickened execution specializes nodes to the values
+        they see as it runs. What the execution does is counted in metrics,
+        if given.
+
+        Only one engine runs the program. A program that spawns tasks always
+        runs on the asynchronous engine, which is stackless, and otherwise
+        stackless wins over quicken: quicken is ignored in both cases.
+        """
+
+        for name in values or ():
+            if name not in program.variables:
+                error(f"Cannot inject value for undeclared variable '{name}'")
+
+        self.program = program
+
+        if program.concurrent:
+            self.interpreter = AsyncInterpreter(out=out, values=values, stack_limit=stack_limit)
+
+        elif stackless:
+            self.interpreter = StacklessInterpreter(out=out, values=values, stack_limit=stack_limit)
+
+        elif quicken:
+            self.interpreter = QuickeningInterpreter(out=out, values=values)
+
+        else:
+            self.interpreter = Interpreter(out=out, values=values)
+
+        self.metrics = metrics
+
+        if metrics is not None:
+            metrics.attach(self.interpreter)
+
+    def run(self) -> None:
+        """
+        Runs the program
+        """
+
+        if self.metrics is None:
+            self.interpreter.execute(self.program.tree)
+            return
+
+        start = time.perf_counter()
+
+        try:
+            self.interpreter.execute(self.program.tree)
+        finally:
+            self.metrics.finish(self.interpreter, time.perf_counter() - start)
+
+
+def compile_program(text: str, optimize: bool = False, metrics: Metrics = None) -> CompiledProgram:
+    """
+    Parses and checks source text, returning a program that can be run many
+    times. How long each phase takes is counted in metrics, if given.
+    """
+
+    if metrics is None:
+        tree = Parser(Tokenizer(text)).parse()
+
+        if optimize:
+            tree = optimizer.optimize(tree)
+
+        return CompiledProgram(tree, optimize)
+
+    tokenizer = TimedTokenizer(text)
+
+    start = time.perf_counter()
+    tree = Parser(tokenizer).parse()
+    parsed = time.perf_counter()
+
+    metrics.tokens += tokenizer.tokens
+    metrics.observe("tokenize", tokenizer.elapsed)
+    metrics.observe("parse", parsed - start - tokenizer.elapsed)
+
+    if optimize:
+        tree = optimizer.optimize(tree)
+        metrics.observe("optimize", time.perf_counter() - parsed)
+
+    return CompiledProgram(tree, optimize)
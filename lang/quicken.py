@@ -0,0 +1,298 @@
+from typing import Any
+
+import lang.operators as operators
+import lang.validation as validation
+import lang.hooks as hooks
+
+from lang.error import error
+from lang.interpreter import Interpreter
+from lang.ast import AST, ArrayElement, BinaryOperator, ProcessCall
+
+# Quickening interpreter
+
+# Number of times a node may lose its specialization before it is left
+# generic for good
+MAX_DEOPTS = 3
+
+
+class QuickBinaryOperator(BinaryOperator):
+    """
+    Binary operator specialized to the types its operands had when it was
+    last run, along with the function applying it to them
+    """
+
+
+class QuickArrayElement(ArrayElement):
+    """
+    Array element whose array has so far been nested lists indexed by
+    integers, so its indices can be checked in place
+    """
+
+
+class QuickProcessCall(ProcessCall):
+    """
+    Call to a process whose body has been resolved, so that it can be run
+    without looking up the process it calls
+    """
+
+
+class QuickCallHook(hooks.CallHook):
+    """
+    Reports calls made by quickened call nodes too, which would otherwise
+    push their frames without going through _enter
+    """
+
+    def _quick_process_call(self, node: AST) -> Any:
+        """
+        Runs a quickened call through the generic visit, so that the call is
+        reported
+        """
+
+        return Interpreter._process_call(self, node)
+
+
+class Stats(object):
+    """
+    Counts how often nodes of one kind are specialized, and how often a
+    specialization turns out not to hold
+    """
+
+    def __init__(self):
+        self.specialized = 0
+        self.deoptimized = 0
+
+        # Nodes left generic after losing their specialization too often
+        self.abandoned = 0
+
+    @property
+    def stability(self) -> float:
+        """
+        Fraction of specializations that have held so far
+        """
+
+        if not self.specialized:
+            return 1.0
+
+        return 1 - self.deoptimized / self.specialized
+
+    def __str__(self) -> str:
+        return (f"specialized {self.specialized}, deoptimized {self.deoptimized}, "
+                f"abandoned {self.abandoned}, stability {self.stability:.2%}")
+
+
+class QuickeningInterpreter(Interpreter):
+    """
+    Interpreter that rewrites nodes into versions specialized to what it has
+    seen them do. Binary operators specialize to the types of their
+    operands, array elements to list arrays and integer indices, and process
+    calls to the body they run. Each specialized node checks a guard before
+    taking its fast path, and rewrites itself back to the generic node if
+    the guard fails.
+    """
+
+    _quick_methods = {
+        QuickBinaryOperator: "_quick_binary_operator",
+        QuickArrayElement  : "_quick_array_element",
+        QuickProcessCall   : "_quick_process_call"
+    }
+
+    hook_mixins = dict(Interpreter.hook_mixins, on_call=QuickCallHook)
+
+    def __init__(self, text: str = None, out: Any = None, values: dict = None,
+                 stack_limit: int = None):
+        super().__init__(text, out, values, stack_limit)
+
+        # Maps each node class to the function that visits it
+        self._methods = {}
+
+        self.stats = {
+            "binary_operator": Stats(),
+            "array_element"  : Stats(),
+            "process_call"   : Stats()
+        }
+
+    def visit(self, node: AST) -> Any:
+        """
+        Visits a node with the method for its class, which for specialized
+        nodes is their quick version
+        """
+
+        method = self._methods.get(type(node))
+
+        if method is None:
+            name = self._quick_methods.get(type(node), f"_{node.name()}")
+            method = getattr(type(self), name, type(self).default)
+            self._methods[type(node)] = method
+
+        return method(self, node)
+
+    def _hook(self) -> None:
+        """
+        Replaces the interpreter's class as the base does, then forgets the
+        visit method found for each node class
+        """
+
+        super()._hook()
+
+        # Visit methods may have been replaced along with the class
+        self._methods = {}
+
+    def _specialize(self, node: AST, quick: type, **guards: Any) -> bool:
+        """
+        Rewrites a node into its specialized version, given what its guard
+        checks and its fast path uses, unless it has lost its specialization
+        too often. Returns true if the node was rewritten.
+        """
+
+        if getattr(node, "deopts", 0) >= MAX_DEOPTS:
+            return False
+
+        # The class is swapped last, so that another execution running the
+        # node never sees the specialized version without what it needs
+        for name, value in guards.items():
+            setattr(node, name, value)
+
+        node.__class__ = quick
+        self.stats[node.name()].specialized += 1
+
+        return True
+
+    def _deoptimize(self, node: AST, generic: type) -> None:
+        """
+        Rewrites a node whose guard failed back into its generic version
+        """
+
+        node.__class__ = generic
+        node.deopts = getattr(node, "deopts", 0) + 1
+
+        stats = self.stats[node.name()]
+        stats.deoptimized += 1
+
+        if node.deopts == MAX_DEOPTS:
+            stats.abandoned += 1
+
+    def _binary_operator(self, node: AST) -> Any:
+        """
+        Interprets a binary operator, specializing it to its operand types
+        """
+
+        l = self.visit(node.left)
+        r = self.visit(node.right)
+
+        value = self._binary(node.value, node.pos, l, r)
+
+        self._specialize(node, QuickBinaryOperator, l_type=type(l), r_type=type(r),
+                         function=operators.binary[(node.value, type(l), type(r))])
+
+        return value
+
+    def _quick_binary_operator(self, node: AST) -> Any:
+        """
+        Applies a binary operator's function straight to its operands if
+        their types are the ones it was specialized to
+        """
+
+        l = self.visit(node.left)
+        r = self.visit(node.right)
+
+        if type(l) is node.l_type and type(r) is node.r_type:
+            return node.function(l, r)
+
+        self._deoptimize(node, BinaryOperator)
+        return self._binary(node.value, node.pos, l, r)
+
+    def _array_element(self, node: AST) -> Any:
+        """
+        Interprets an array element, specializing it if its array is lists
+        """
+
+        value = super()._array_element(node)
+
+        if not node.safe and type(self.stack.display[node.depth][node.arr_name]) is list:
+            self._specialize(node, QuickArrayElement)
+
+        return value
+
+    def _quick_array_element(self, node: AST) -> Any:
+        """
+        Indexes lists in place for as long as the indices are integers in
+        bounds, going generic from the first level where one is not
+        """
+
+        arr = self.stack.display[node.depth][node.arr_name]
+        indices = node.indices
+
+        for i in range(len(indices)):
+            index = self.visit(indices[i])
+
+            if type(arr) is not list or type(index) is not int or index >= len(arr):
+                self._deoptimize(node, ArrayElement)
+                return self._finish_array_element(node, arr, index, i)
+
+            arr = arr[index]
+
+        return arr
+
+    def _finish_array_element(self, node: AST, arr: Any, index: Any, i: int) -> Any:
+        """
+        Indexes the rest of an array element generically, from the level
+        where its guard failed. Indices that have already been evaluated are
+        not evaluated again.
+        """
+
+        pos = node.pos
+
+        validation.validate_array_index(pos, index, arr)
+        arr = arr[index]
+
+        for index_node in node.indices[i + 1:]:
+            index = self.visit(index_node)
+            validation.validate_array_index(pos, index, arr)
+
+            arr = arr[index]
+
+        return arr
+
+    def _process_call(self, node: AST) -> Any:
+        """
+        Interprets a process call, specializing it to the process it runs
+        """
+
+        value = super()._process_call(node)
+
+        if not node.proc_sym.is_builtin:
+            self._specialize(node, QuickProcessCall, process=node.proc_sym.process)
+
+        return value
+
+    def _quick_process_call(self, node: AST) -> Any:
+        """
+        Runs the body of the process a call was specialized to, pushing its
+        frame without looking up the process again
+        """
+
+        proc_sym = node.proc_sym
+
+        if proc_sym.process is not node.process:
+            # The incremental parser keeps the symbol of a process whose body
+            # was edited, giving it the new process, while quickened callers
+            # it cached still hold the old one
+            self._deoptimize(node, ProcessCall)
+            return self._process_call(node)
+
+        args = [self.visit(arg) for arg in node.args]
+        stack = self.stack
+
+        if stack.full():
+            error(f"Stack overflow, the call stack is limited to {stack.limit} frames", node.pos)
+
+        record = stack.frame(node.value, proc_sym.sc_level)
+        memory = record.memory
+
+        for name, arg in zip(proc_sym.param_names, args):
+            memory[name] = arg
+
+        stack.push(record)
+        self.visit(node.process.block)
+
+        return self._leave(node)
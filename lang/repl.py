@@ -0,0 +1,153 @@
+import lang.token as tok
+
+from lang.tokenizer import Tokenizer
+from lang.interpreter import Interpreter
+from lang.callstack import ActivationRecord
+from lang.ast import *
+
+# Read-eval-print loop
+
+PROMPT = "cou> "
+CONTINUE = "...  "
+
+# Statements whose value is echoed back to the user
+_EXPRESSIONS = (Number, Boolean, String, Nothing, ArrayInitialization,
+                ArrayElement, UnaryOperator, BinaryOperator, Variable,
+                ProcessCall, Await)
+
+
+class Repl(object):
+    """
+    Interactive session. A single parser (and so a single symbol table) and a
+    single 'main' frame are kept alive across inputs, so that each input only
+    needs to parse and run the code that was just entered.
+    """
+
+    def __init__(self):
+        """
+        Initializes the session with an empty program
+        """
+
+        self.interpreter = Interpreter('')
+        self.parser = self.interpreter.parser
+
+        self.record = ActivationRecord("main", 1)
+        self.interpreter.stack.push(self.record)
+
+        # Sources of the inputs that declared processes, which outlive the
+        # input they came from
+        self.sources = []
+
+    def _parse(self, text: str) -> AST:
+        """
+        Parses text against the session's symbol table. On failure, the symbol
+        table is restored to what it was before the input was entered.
+        """
+
+        symtab = self.parser.symtab
+        symbols = symtab.snapshot()
+
+        try:
+            self.parser.reset(Tokenizer(text))
+            program = self.parser.parse()
+
+        except SyntaxError:
+            self.parser.symtab = symtab
+            symtab.restore(symbols)
+            raise
+
+        if any(isinstance(statement, Process) for statement in program.statements):
+            self.sources.extend(program.sources)
+
+        return program
+
+    def _run(self, program: AST) -> None:
+        """
+        Runs newly parsed statements in the session's frame, echoing the value
+        of naked expressions
+        """
+
+        interpreter = self.interpreter
+
+        for statement in program.statements:
+            value = interpreter.visit(statement)
+
+            if isinstance(statement, _EXPRESSIONS) and value is not None:
+                print(interpreter._cou_str(value))
+
+            if self.record.returned:
+                # A top level return ends the current input, not the session
+                self.record.returned = False
+                self.record.ret_val = None
+                return
+
+    def _execute(self, program: AST, symbols: dict) -> None:
+        """
+        Runs a parsed input. On failure, names declared by the input are
+        forgotten.
+        """
+
+        try:
+            self._run(program)
+
+        except Exception:
+            self.parser.symtab.restore(symbols)
+            raise
+
+    def feed(self, text: str) -> None:
+        """
+        Parses and runs a piece of source text
+        """
+
+        symbols = self.parser.symtab.snapshot()
+        self._execute(self._parse(text), symbols)
+
+    def _read(self) -> None:
+        """
+        Reads lines until they form a complete input, then runs it
+        """
+
+        text = input(PROMPT)
+        symbols = self.parser.symtab.snapshot()
+
+        while True:
+            try:
+                program = self._parse(text)
+                break
+
+            except SyntaxError:
+                # Only ask for more lines if the parser ran out of input
+                if not text.strip() or self.parser.curr.type != tok.EOF:
+                    raise
+
+                line = input(CONTINUE)
+                if not line.strip():
+                    raise
+
+                text += "\n" + line
+
+        self._execute(program, symbols)
+
+    def run(self) -> None:
+        """
+        Runs the session until end of input
+        """
+
+        try:
+            import readline  # Line editing and history, where available
+        except ImportError:
+            pass
+
+        while True:
+            try:
+                self._read()
+
+            except EOFError:
+                print()
+                return
+
+            except KeyboardInterrupt:
+                print()
+
+            except Exception as err:
+                print(f"{type(err).__name__}: {err}")
@@ -0,0 +1,109 @@
+import copy
+import asyncio
+
+from typing import Any, Generator, List
+
+import lang.validation as validation
+
+from lang.stackless import StacklessInterpreter
+from lang.task import Task
+from lang.ast import AST
+
+# Concurrent tasks
+
+
+class AsyncInterpreter(StacklessInterpreter):
+    """
+    Interpreter that runs the main program, and every process call started
+    with spawn, as coroutines on an asyncio event loop. Each task has its own
+    call stack. Tasks take turns whenever one of them waits on a builtin or
+    awaits another task, so their waits overlap.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # A task can outlive the call that spawned it and still refer to its
+        # frame, so frames are never reused
+        self.stack.pooled = False
+
+        # Every task spawned so far, shared by the interpreters of all tasks
+        self.tasks = []
+
+    async def _drive(self, visit: Generator) -> Any:
+        """
+        Runs a visit as a coroutine, waiting on whatever it suspends on
+        """
+
+        run = self._run(visit)
+        value = None
+
+        while True:
+            try:
+                awaitable = run.send(value)
+            except StopIteration as stop:
+                return stop.value
+
+            value = await awaitable
+
+    def _fork(self) -> "AsyncInterpreter":
+        """
+        Returns an interpreter for a new task, with a call stack of its own
+        that starts at the current frame
+        """
+
+        forked = copy.copy(self)
+        forked.stack = self.stack.fork()
+
+        return forked
+
+    def _invoke(self, node: AST, args: List[Any]) -> Any:
+        proc_sym = node.proc_sym
+
+        if not (proc_sym.is_builtin and proc_sym.async_call):
+            return (yield from super()._invoke(node, args))
+
+        self._check_args(node, args)
+        ret_val = yield proc_sym.async_call(node.pos, *args)
+
+        validation.validate_return(proc_sym.type_def, node.pos, ret_val)
+        return ret_val
+
+    def _spawn(self, node: AST) -> Task:
+        args = yield from self._args(node.call)
+
+        forked = self._fork()
+        future = asyncio.ensure_future(forked._drive(forked._invoke(node.call, args)))
+
+        self.tasks.append(future)
+        return Task(future)
+
+    def _await(self, node: AST) -> Any:
+        task = yield node.child
+        validation.validate_task(node.pos, task)
+
+        if task.future is None:
+            return task.result
+
+        return (yield task.future)
+
+    async def _main(self, tree: AST) -> None:
+        """
+        Runs a program, then waits for the tasks that were never awaited
+        """
+
+        await self._drive(self._start(tree))
+
+        waited = 0
+        while waited < len(self.tasks):
+            pending = self.tasks[waited:]
+            waited = len(self.tasks)
+
+            await asyncio.gather(*pending)
+
+    def execute(self, tree: AST) -> None:
+        """
+        Interprets a tree on a new event loop
+        """
+
+        asyncio.run(self._main(tree))
@@ -0,0 +1,509 @@
+from types import GeneratorType
+from typing import Any, Generator, List
+
+import lang.validation as validation
+import lang.parallel as parallel
+
+from lang.error import error
+from lang.interpreter import Interpreter
+from lang.callstack import ActivationRecord
+from lang.task import Task
+from lang.array import FlatArray, SparseArray
+from lang.ast import AST
+
+# Resumable interpreter
+
+# Default number of frames the call stack can hold. Frames live on the heap,
+# so this is a guard against runaway recursion rather than a python limit.
+STACK_LIMIT = 1000000
+
+
+class StacklessNodeCounter(object):
+    """
+    Counts each node as it is started, which every node visited by a
+    stackless interpreter goes through
+    """
+
+    def _start(self, node: AST) -> Any:
+        """
+        Counts a node, then starts it as the hooked interpreter would
+        """
+
+        self.node_counts[type(node)] += 1
+        return self.unhooked._start(self, node)
+
+
+class StacklessPositionTracker(object):
+    """
+    Keeps the position of the statement each frame is running in its pos,
+    as statements are yielded by a stackless interpreter
+    """
+
+    def _execute_statements(self, statements: List[AST]) -> None:
+        """
+        Yields each statement to run, after recording its position in the
+        frame
+        """
+
+        record = self.stack.peek()
+
+        for statement in statements:
+            record.pos = statement.pos
+            yield statement
+
+            if record.returned:
+                return
+
+    def _execute_injected(self, statements: List[AST]) -> None:
+        """
+        Yields each statement that was not injected to run, after recording
+        its position in the frame
+        """
+
+        record = self.stack.peek()
+
+        for statement in statements:
+            record.pos = statement.pos
+
+            if not self._inject(statement):
+                yield statement
+
+            if record.returned:
+                return
+
+
+class StacklessInterpreter(Interpreter):
+    """
+    Interpreter whose visit methods are generators. Instead of visiting its
+    children, a method yields them and is sent back their values, so the
+    interpreter keeps its own stack of unfinished visits rather than
+    recursing in python. Anything else a method yields (such as a builtin
+    waiting on I/O) suspends the whole stack, which can then be resumed.
+    """
+
+    hook_mixins = dict(Interpreter.hook_mixins, nodes=StacklessNodeCounter,
+                       positions=StacklessPositionTracker)
+
+    def __init__(self, text: str = None, out: Any = None, values: dict = None,
+                 stack_limit: int = STACK_LIMIT):
+        super().__init__(text, out, values, stack_limit)
+
+        # Maps each node class to the function that visits it
+        self._methods = {}
+
+    def _start(self, node: AST) -> Any:
+        """
+        Starts visiting a node. Returns a generator for nodes whose visit
+        needs other nodes to be visited first, or else the node's value.
+        """
+
+        method = self._methods.get(type(node))
+
+        if method is None:
+            method = getattr(type(self), f"_{node.name()}", type(self).default)
+            self._methods[type(node)] = method
+
+        return method(self, node)
+
+    def _run(self, visit: Generator) -> Generator:
+        """
+        Runs a visit to completion, passing on whatever it suspends on
+        """
+
+        visits = [visit]
+        value = None
+
+        while visits:
+            try:
+                request = visits[-1].send(value)
+
+            except StopIteration as stop:
+                visits.pop()
+                value = stop.value
+                continue
+
+            if isinstance(request, AST):
+                value = self._start(request)
+
+                if type(value) == GeneratorType:
+                    visits.append(value)
+                    value = None
+
+            else:
+                value = yield request
+
+        return value
+
+    def visit(self, node: AST) -> Any:
+        """
+        Visits a node, where it cannot be suspended
+        """
+
+        value = self._start(node)
+
+        if type(value) != GeneratorType:
+            return value
+
+        run = self._run(value)
+
+        try:
+            run.send(None)
+        except StopIteration as stop:
+            return stop.value
+
+        error("Cannot wait outside of a task", getattr(node, "pos", None))
+
+    def _array_element(self, node: AST) -> Any:
+        """
+        Yields the indices of an array element, and returns the element
+        """
+
+        pos = node.pos
+        arr = self.stack.display[node.depth][node.arr_name]
+
+        if type(arr) == SparseArray and arr.dense is not None:
+            arr = self._dense(node.depth, node.arr_name)
+
+        if node.safe and self.trusted:
+            return arr[(yield node.indices[0])]
+
+        if type(arr) == FlatArray:
+            indices = []
+            for index_node in node.indices:
+                indices.append((yield index_node))
+
+            cell = arr.locate(indices)
+
+            if cell is not None and len(indices) == arr.ndim:
+                return arr.cells[cell]
+
+            return self._flat_element(pos, arr, indices, cell)
+
+        for index_node in node.indices:
+            index = yield index_node
+            validation.validate_array_index(pos, index, arr)
+
+            arr = arr[index]
+
+        return arr
+
+    def _array_element_assignment(self, node: AST) -> None:
+        """
+        Yields the indices of an array element, then the value stored in it
+        """
+
+        pos = node.pos
+        arr = self.stack.display[node.left.depth][node.left.arr_name]
+
+        if type(arr) == SparseArray and arr.dense is not None:
+            arr = self._dense(node.left.depth, node.left.arr_name)
+
+        indices = node.left.indices
+
+        if node.left.safe and self.trusted:
+            index = yield indices[0]
+            arr[index] = yield node.right
+            return
+
+        if type(arr) == FlatArray:
+            values = []
+            for index_node in indices:
+                values.append((yield index_node))
+
+            cell = arr.locate(values)
+
+            if cell is not None and len(values) == arr.ndim:
+                arr = arr.cells
+            else:
+                arr, cell = self._flat_cell(pos, arr, values, cell)
+
+            arr[cell] = yield node.right
+            return
+
+        for index_node in indices[:-1]:
+            index = yield index_node
+            validation.validate_array_index(pos, index, arr)
+
+            arr = arr[index]
+
+        index = yield indices[-1]
+        validation.validate_array_index(pos, index, arr)
+        arr[index] = yield node.right
+
+    def _array_initialization(self, node: AST) -> Any:
+        """
+        Yields the sizes of a new array, and returns the array
+        """
+
+        sizes = []
+        for size in node.sizes:
+            sizes.append((yield size))
+
+        return self._allocate(node.pos, sizes)
+
+    def _unary_operator(self, node: AST) -> Any:
+        """
+        Yields the operand of a unary operator, and returns its result
+        """
+
+        operand = yield node.child
+        return self._unary(node.value, node.pos, operand)
+
+    def _binary_operator(self, node: AST) -> Any:
+        """
+        Yields both operands of a binary operator, and returns its result
+        """
+
+        l = yield node.left
+        r = yield node.right
+
+        return self._binary(node.value, node.pos, l, r)
+
+    def _logical_operator(self, node: AST) -> Any:
+        """
+        Yields the left operand of a logical operator, and the right one only
+        if the left does not decide the result
+        """
+
+        l = yield node.left
+
+        if l is node.decides:
+            return l
+
+        r = yield node.right
+
+        return self._binary(node.value, node.pos, l, r)
+
+    def _shared_expression(self, node: AST) -> Any:
+        """
+        Yields an expression whose value is reused, and keeps the value
+        """
+
+        value = yield node.expression
+        self.stack.display[node.depth].memory[node.value] = value
+
+        return value
+
+    def _say(self, node: AST) -> None:
+        """
+        Yields the value of a say statement, and prints it
+        """
+
+        visited = yield node.value
+        print(self._cou_str(visited), file=self.out)
+
+    def _assignment_statement(self, node: AST) -> None:
+        """
+        Yields the value of an assignment, and stores it
+        """
+
+        asn = yield node.right
+        validation.validate_type(node.left.var_type, node.pos, asn)
+
+        self.stack.display[node.left.depth].memory[node.left.value] = asn
+
+    def _conditions(self, node: AST) -> None:
+        """
+        Yields each condition until one holds, then the block it guards
+        """
+
+        for cond in node.conditions:
+
+            eval = yield cond.condition
+            validation.validate_condition(cond.pos, eval)
+
+            if eval:
+                yield cond.block
+                return
+
+    def _as(self, node: AST) -> None:
+        """
+        Yields the counter of an as loop, then runs the loop. The iterations of
+        'par as' loops are run by other processes, so are not yielded.
+        """
+
+        counter = node.declr.counter
+
+        if counter:
+            yield counter
+
+        if node.parallel:
+            parallel.run(self, node)
+        else:
+            yield from self._loop(node)
+
+    def _loop(self, node: AST) -> None:
+        """
+        Runs an as loop after its counter has been initialized. A return inside
+        the block only marks the frame, as the block is yielded rather than
+        called, so the frame is checked after each iteration.
+        """
+
+        condition = node.declr.condition
+        do_after = node.declr.after
+
+        record = self.stack.peek()
+
+        condition_eval = yield condition
+        validation.validate_condition(node.pos, condition_eval)
+
+        while condition_eval:
+            yield node.block
+            if record.returned:
+                return
+
+            if do_after:
+                yield do_after
+
+            condition_eval = yield condition
+            validation.validate_condition(node.pos, condition_eval)
+
+    def _return(self, node: AST) -> None:
+        """
+        Yields the value of a return statement, and marks the frame as
+        returned for the loops and blocks yielding it to stop
+        """
+
+        record = self.stack.peek()
+
+        record.ret_val = yield node.statement
+        record.returned = True
+
+    def _args(self, node: AST) -> List[Any]:
+        """
+        Evaluates the arguments of a process call
+        """
+
+        args = []
+        for arg in node.args:
+            args.append((yield arg))
+
+        return args
+
+    def _process_call(self, node: AST) -> Any:
+        """
+        Yields the arguments of a process call, then runs the call
+        """
+
+        args = yield from self._args(node)
+        return (yield from self._invoke(node, args))
+
+    def _invoke(self, node: AST, args: List[Any]) -> Any:
+        """
+        Runs a process call, given the values of its arguments
+        """
+
+        if node.proc_sym.is_builtin:
+            return self._builtin(node, args)
+
+        self._enter(node, args)
+        yield node.proc_sym.process.block
+
+        return self._leave(node)
+
+    def _inlined_call(self, node: AST) -> Any:
+        """
+        Yields the arguments of an inlined call, then its body in the caller's
+        frame, and returns what the body returned
+        """
+
+        args = yield from self._args(node)
+
+        record = self.stack.peek()
+        record.memory.update(zip(node.params, args))
+
+        yield node.block
+        return self._inlined_return(node, record)
+
+    def _spawn(self, node: AST) -> Task:
+        """
+        Yields a call to run as a task, and returns the finished task.
+        AsyncInterpreter runs the call alongside the spawning task instead.
+        """
+
+        return Task(result=(yield node.call))
+
+    def _await(self, node: AST) -> Any:
+        """
+        Yields a task, and returns its result
+        """
+
+        task = yield node.child
+        validation.validate_task(node.pos, task)
+
+        return task.result
+
+    def _str_buffer(self, node: AST) -> None:
+        """
+        Yields a loop with buffers for the str variables it builds up, and joins
+        them once it finishes
+        """
+
+        records = self._open_buffers(node)
+        yield node.loop
+        self._close_buffers(node, records)
+
+    def _str_append(self, node: AST) -> None:
+        """
+        Yields the parts appended to a str variable, and adds them to its
+        buffer
+        """
+
+        parts = []
+        for part in node.parts:
+            value = yield part
+            parts.append(value if type(value) == str else self._cou_str(value))
+
+        var = node.variable
+        self.stack.display[var.depth].memory[var.value].extend(parts)
+
+    def _execute_statements(self, statements: List[AST]) -> None:
+        """
+        Yields each statement to run. A return only marks the frame, as the
+        statement is yielded rather than called, so the frame is checked after
+        each one.
+        """
+
+        record = self.stack.peek()
+
+        for statement in statements:
+            yield statement
+            if record.returned:
+                return
+
+    def _execute_injected(self, statements: List[AST]) -> None:
+        """
+        Yields each statement that was not injected to run, stopping once the
+        frame has returned
+        """
+
+        record = self.stack.peek()
+
+        for statement in statements:
+            if not self._inject(statement):
+                yield statement
+
+            if record.returned:
+                return
+
+    def _block(self, node: AST) -> None:
+        """
+        Yields the statements of a block
+        """
+
+        yield from self._execute_statements(node.statements)
+
+    def _program(self, node: AST) -> None:
+        """
+        Yields the statements of a program in the main frame
+        """
+
+        record = ActivationRecord("main", 1)
+        self.stack.push(record)
+
+        if self.values:
+            yield from self._execute_injected(node.statements)
+        else:
+            yield from self._execute_statements(node.statements)
+
+        self._exit()
@@ -0,0 +1,159 @@
+import codecs
+
+from typing import Any, List
+
+# Buffered input
+
+# Number of bytes read from a stream at a time
+CHUNK_SIZE = 1 << 20
+
+
+class Reader(object):
+    """
+    Reads text from a binary stream. Bytes are read in large chunks and
+    decoded a whole chunk at a time, so that lines can be split off the
+    decoded text without going back to the stream for each one.
+    """
+
+    def __init__(self, stream: Any, chunk_size: int = CHUNK_SIZE, encoding: str = "utf-8"):
+        """
+        Initializes a reader over a binary stream
+        """
+
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+        self._decoder = codecs.getincrementaldecoder(encoding)()
+        self._read = getattr(stream, "read1", stream.read)
+
+        # Decoded text that has not been consumed yet starts at pos
+        self._text = ''
+        self._pos = 0
+
+        self.eof = False
+
+    def _chunk(self) -> str:
+        """
+        Reads and decodes the next chunk of the stream. Returns an empty
+        string at the end of the stream, or if the chunk ends part way
+        through a character.
+        """
+
+        if self.eof:
+            return ''
+
+        data = self._read(self.chunk_size)
+        self.eof = not data
+
+        return self._decoder.decode(data, final=self.eof)
+
+    def _fill(self) -> bool:
+        """
+        Adds another chunk to the unconsumed text, returning false at the end
+        of the stream
+        """
+
+        while not self.eof:
+            text = self._chunk()
+
+            if text:
+                self._text = self._text[self._pos:] + text
+                self._pos = 0
+                return True
+
+        return False
+
+    def at_end(self) -> bool:
+        """
+        Returns true if there is nothing left to read
+        """
+
+        return self._pos >= len(self._text) and not self._fill()
+
+    def readline(self) -> str:
+        """
+        Reads the next line, without its line break. Returns None at the end
+        of the stream.
+        """
+
+        while True:
+            end = self._text.find('\n', self._pos)
+
+            if end != -1:
+                line = self._text[self._pos:end]
+                self._pos = end + 1
+
+                return line[:-1] if line.endswith('\r') else line
+
+            if not self._fill():
+                break
+
+        if self._pos >= len(self._text):
+            return None
+
+        line = self._text[self._pos:]
+        self._pos = len(self._text)
+
+        return line
+
+    def read(self) -> str:
+        """
+        Reads everything left in the stream
+        """
+
+        chunks = [self._text[self._pos:]]
+
+        while not self.eof:
+            chunks.append(self._chunk())
+
+        self._text = ''
+        self._pos = 0
+
+        return ''.join(chunks)
+
+    def readlines(self) -> List[str]:
+        """
+        Reads every line left in the stream, without their line breaks
+        """
+
+        text = self.read()
+        if not text:
+            return []
+
+        if '\r' in text:
+            text = text.replace('\r\n', '\n')
+
+        lines = text.split('\n')
+
+        if text.endswith('\n'):
+            lines.pop()
+
+        return lines
+
+
+class File(object):
+    """
+    File opened by a program, read one line at a time through a Reader so
+    that only a chunk of it is held in memory
+    """
+
+    def __init__(self, path: str):
+        """
+        Opens a file for reading
+        """
+
+        self.path = path
+
+        self._file = open(path, "rb", buffering=0)
+        self.reader = Reader(self._file)
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self) -> None:
+        """
+        Closes the file, if it is still open
+        """
+
+        self._file.close()
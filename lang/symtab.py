@@ -1,6 +1,5 @@
 import lang.token as tok
 
-from collections import defaultdict
 from typing import List, Any
 
 
@@ -13,6 +12,10 @@ class Symbol(object):
         self.name = name
         self.type_def = type_def
         self.is_proc = False # Flag for process symbol
+        self.is_builtin = False # Flag for process implemented in python
+
+        # Level of the frame the symbol lives in, set when it is declared
+        self.depth = None
 
     def __repr__(self) -> str:
         return str(self)
@@ -48,6 +51,9 @@ class ProcessSymbol(Symbol):
     """
 
     def __init__(self, name: str, type_def: str, sc_level: int, params: List[VariableSymbol] = None):
+        """
+        Initializes a process whose frames are at sc_level
+        """
 
         super().__init__(name, type_def)
 
@@ -57,6 +63,17 @@ class ProcessSymbol(Symbol):
         self.sc_level = sc_level
         self.process = None
 
+    @property
+    def params(self) -> List[Any]:
+        return self._params
+
+    @params.setter
+    def params(self, params: List[Any]) -> None:
+        self._params = params
+
+        # Names the arguments of a call are bound to, in order
+        self.param_names = tuple(param.value for param in params)
+
     def __str__(self) -> str:
         param_fmt = ''
         if self.params:
@@ -66,61 +83,254 @@ class ProcessSymbol(Symbol):
         return f"proc <{self.name}: {self.type_def}({param_fmt})>"
 
 
-class SymbolTable(object):
+class BuiltinSymbol(ProcessSymbol):
     """
-    Represents a symbol table
+    Represents a process provided by the interpreter. It is called with the
+    values of its arguments, and may have an asynchronous version that is
+    used when running tasks.
     """
 
-    def __init__(self, sc_level: int, sc_name: str, sc_enclosing=None):
-        self._symbols = defaultdict()
-        self._init_type_syms()
+    def __init__(self, name: str, type_def: str, params: List[Any], call: Any, async_call: Any = None):
+
+        super().__init__(name, type_def, 1, params)
 
+        self.is_builtin = True
+
+        self.call = call
+        self.async_call = async_call
+
+    def __str__(self) -> str:
+        return f"builtin {super().__str__()}"
+
+
+# Type symbols, shared by every table
+_type_syms = {name: TypeSymbol(name)
+              for name in (tok.NUM, tok.BOOL, tok.STR, tok.NIL, tok.TASK, tok.FILE)}
+
+
+class Scope(object):
+    """
+    A scope that is open in a symbol table
+    """
+
+    def __init__(self, sc_level: int, sc_name: str, depth: int):
         self.sc_level = sc_level
         self.sc_name = sc_name
-        self.sc_enclosing = sc_enclosing
+
+        # Level of the frame its variables live in at run time. The global
+        # scope and each process get a frame, while blocks share the frame
+        # of their enclosing scope.
+        self.depth = depth
+
+        # Names declared in the scope, in order
+        self.names = []
+
+
+class SymbolTable(object):
+    """
+    Represents the symbol table of a program. Each name maps to a stack of
+    the symbols declared with it in the scopes that are currently open,
+    innermost last, so a lookup is a single dictionary access however deeply
+    scopes are nested. Opening a scope is constant time, and closing one only
+    touches the names declared in it.
+
+    Builtins live in a scope of their own that encloses the global one, so a
+    name declared in any scope hides the builtin with the same name.
+    """
+
+    def __init__(self):
+        self._symbols = {}
+        self._scopes = [Scope(1, "global", 1)]
+        self._builtins = {}
+        self._init_type_syms()
 
     def _init_type_syms(self):
         """
         Initalizes type symbols
         """
 
-        self[tok.NUM]  = TypeSymbol(tok.NUM)
-        self[tok.BOOL] = TypeSymbol(tok.BOOL)
-        self[tok.STR]  = TypeSymbol(tok.STR)
-        self[tok.NIL]  = TypeSymbol(tok.NIL)
+        for name, symbol in _type_syms.items():
+            symbol.depth = 1
+            self._symbols[name] = [(1, symbol)]
+            self._scopes[0].names.append(name)
+
+    @property
+    def sc_level(self) -> int:
+        return len(self._scopes)
+
+    @property
+    def sc_name(self) -> str:
+        return self._scopes[-1].sc_name
+
+    @property
+    def depth(self) -> int:
+        return self._scopes[-1].depth
 
     def __str__(self) -> str:
         s = f"symtab {self.sc_name}, level:{self.sc_level}"
 
-        for key in self._symbols:
-            s += f"\n  {self._symbols[key]}"
+        for key, entries in self._symbols.items():
+            for level, symbol in entries:
+                s += f"\n  {'  ' * (level - 1)}{symbol}"
 
         return s
 
+    def push(self, sc_name: str, frame: bool = False) -> None:
+        """
+        Opens a nested scope. A scope with a frame of its own is one level
+        deeper at run time
+        """
+
+        scope = self._scopes[-1]
+        self._scopes.append(Scope(scope.sc_level + 1, sc_name, scope.depth + frame))
+
+    def pop(self) -> None:
+        """
+        Closes the innermost scope, forgetting the names declared in it
+        """
+
+        symbols = self._symbols
+
+        for key in self._scopes.pop().names:
+            entries = symbols[key]
+            entries.pop()
+
+            if not entries:
+                del symbols[key]
+
+    def unwind(self) -> None:
+        """
+        Closes every scope but the global one
+        """
+
+        while len(self._scopes) > 1:
+            self.pop()
+
+    def _declare(self, key: str, symbol: Symbol, scope: Scope) -> None:
+        """
+        Puts a symbol in an open scope
+        """
+
+        symbol.depth = scope.depth
+        entries = self._symbols.get(key)
+
+        if not entries:
+            self._symbols[key] = [(scope.sc_level, symbol)]
+            scope.names.append(key)
+            return
+
+        # Entries are kept in scope order, and a scope holds one per name
+        i = len(entries)
+        while i and entries[i - 1][0] > scope.sc_level:
+            i -= 1
+
+        if i and entries[i - 1][0] == scope.sc_level:
+            entries[i - 1] = (scope.sc_level, symbol)
+            return
+
+        entries.insert(i, (scope.sc_level, symbol))
+        scope.names.append(key)
+
     def __setitem__(self, key: str, symbol: Symbol):
         """
-        Puts a symbol in the table
+        Puts a symbol in the innermost scope
+        """
+
+        self._declare(key, symbol, self._scopes[-1])
+
+    def declare_enclosing(self, key: str, symbol: Symbol) -> None:
+        """
+        Puts a symbol in the scope enclosing the innermost one
+        """
+
+        self._declare(key, symbol, self._scopes[-2])
+
+    def declare_builtin(self, key: str, symbol: Symbol) -> None:
+        """
+        Puts a symbol in the scope enclosing the global one
+        """
+
+        symbol.depth = 1
+        self._builtins[key] = symbol
+
+    def lookup(self, key: str) -> Symbol:
+        """
+        Returns the innermost symbol declared with a name, or None
+        """
+
+        entries = self._symbols.get(key)
+        return entries[-1][1] if entries else self._builtins.get(key)
+
+    def in_scope(self, key: str) -> bool:
+        """
+        Returns true if a name is declared in an open scope, not counting
+        the builtins it would hide
         """
 
-        self._symbols[key] = symbol
+        return key in self._symbols
 
     def __getitem__(self, key: str) -> Symbol:
         """
         Retrieves a symbol from the table
         """
 
-        if key not in self._symbols and self.sc_enclosing:
-            return self.sc_enclosing[key]
+        symbol = self.lookup(key)
+        if symbol is None:
+            raise KeyError(key)
 
-        return self._symbols[key]
+        return symbol
 
     def __contains__(self, key: str):
         """
         Returns true if a symbol exists in the table
         """
 
-        exists_flag = key in self._symbols
-        if self.sc_enclosing and not exists_flag:
-            exists_flag = key in self.sc_enclosing
+        return self.lookup(key) is not None
+
+    def get_global(self, key: str) -> Symbol:
+        """
+        Returns the symbol declared with a name in the global scope, or None
+        """
+
+        entries = self._symbols.get(key)
+        return entries[0][1] if entries and entries[0][0] == 1 else None
+
+    def set_global(self, key: str, symbol: Symbol) -> None:
+        """
+        Puts a symbol in the global scope
+        """
+
+        self._declare(key, symbol, self._scopes[0])
+
+    def inherit(self, table: "SymbolTable", keys: List[str]) -> None:
+        """
+        Copies the global symbols another table has under some names into the
+        global scope
+        """
+
+        symbols = self._symbols
+        names = self._scopes[0].names
+
+        for key in keys:
+            if key not in symbols:
+                names.append(key)
+
+            symbols[key] = [table._symbols[key][0]]
+
+    def snapshot(self) -> dict:
+        """
+        Returns a copy of the symbols declared in the global scope
+        """
+
+        return {key: entries[0][1] for key, entries in self._symbols.items()
+                if entries[0][0] == 1}
+
+    def restore(self, symbols: dict) -> None:
+        """
+        Restores the global scope from a snapshot, closing any other scopes
+        """
+
+        self._symbols = {key: [(1, symbol)] for key, symbol in symbols.items()}
 
-        return exists_flag
+        self._scopes = [Scope(1, "global", 1)]
+        self._scopes[0].names = list(symbols)
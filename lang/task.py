@@ -0,0 +1,18 @@
+from typing import Any
+
+# Handles for spawned process calls
+
+
+class Task(object):
+    """
+    Handle returned by spawn. Holds the asyncio task running a process call
+    or, if the call was run to completion when it was spawned, its result.
+    """
+
+    def __init__(self, future: Any = None, result: Any = None):
+        """
+        Initializes a handle for a running call, or for a finished one
+        """
+
+        self.future = future
+        self.result = result
@@ -1,5 +1,4 @@
 
-from lang.tokenizer import Token
 
 STRING = "string"
 NUMBER = "number"
@@ -16,6 +15,8 @@ NUM = "num"
 BOOL = "bool"
 STR = "str"
 ARR = "arr"
+TASK = "task"
+FILE = "file"
 
 ADD = "+"
 SUB = "-"
@@ -53,6 +54,9 @@ SAY = "say"
 PROC = "proc"
 RETURN = "return"
 AS = "as"
+PAR = "par"
+SPAWN = "spawn"
+AWAIT = "await"
 
 IF = "if"
 ELIF = "elif"
@@ -60,6 +64,19 @@ ELSE = "else"
 
 EOF = "eof"
 
+# Binary operators, from the loosest binding to the tightest. Operators in
+# the same group bind equally tightly, and group from the left.
+binary_operators = (
+    (OR,),
+    (AND,),
+    (EQ, NEQ, GEQ, LEQ, GREATER, LESS),
+    (ADD, SUB),
+    (MUL, DIV, I_DIV, MOD)
+)
+
+# Prefix operators, which bind tighter than any binary operator
+unary_operators = {ADD, SUB, NOT}
+
 reserved_single_char = {
     ADD, SUB, MUL, DIV, MOD,
     NOT,
@@ -80,8 +97,9 @@ reserved_double_char = {
 
 def build_keywords() -> dict:
     return {
-        NUM, STR, BOOL, ARR, NIL,
-        PROC, RETURN, AS,
+        NUM, STR, BOOL, ARR, NIL, TASK, FILE,
+        PROC, RETURN, AS, PAR,
+        SPAWN, AWAIT,
         BOOL_T, BOOL_F, NOTHING,
         IF, ELIF, ELSE,
         SAY
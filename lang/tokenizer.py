@@ -2,28 +2,29 @@ import codecs
 import lang.token as tok
 
 from lang.error import error
+from lang.position import positions
 
 class Token:
     """
-    Represents a single token, with a type and value
+    Represents a single token, with a type, value and position in the
+    position table
     """
 
-    def __init__(self, type: str, value: str, line: int, col: int):
+    def __init__(self, type: str, value: str, pos: int):
         """
-        Initializes token with type and value
+        Initializes token with type, value and position
         """
 
         self.type = type
         self.value = value
-        self.line = line
-        self.col = col
+        self.pos = pos
 
     def __str__(self) -> str:
         """
         Returns string representation of Token
         """
 
-        return f"Token<{self.type},{self.value},{self.line},{self.col}>"
+        return f"Token<{self.type},{self.value},{self.pos}>"
 
     def __repr__(self) -> str:
         """
@@ -34,10 +35,10 @@ class Token:
 
 class Tokenizer(object):
 
-    def __init__(self, input: str):
+    def __init__(self, input: str, line: int = 1, col: int = 1):
         """
-        Initializes tokenizer with an input. Sets offset from that line and
-        initial current character.
+        Initializes tokenizer with an input, which starts at a line and
+        column. Sets initial current character.
         """
 
         self.input = input
@@ -45,8 +46,9 @@ class Tokenizer(object):
 
         self.curr = input[0] if input else None
 
-        self.line = 1
-        self.col = 1
+        # Positions of tokens are offsets from the start of the source
+        self.source = positions.add(input, line, col)
+        self.base = self.source.base
 
         self.keywords = tok.build_keywords()
 
@@ -72,7 +74,6 @@ class Tokenizer(object):
 
         self.curr = self._next()
         self.index += 1
-        self.col += 1
 
         return prev
 
@@ -84,10 +85,6 @@ class Tokenizer(object):
         while self.curr and (self.curr == '#' or self.curr.isspace()):
 
             while self.curr and self.curr.isspace():
-                if self.curr == '\n':
-                    self.line += 1
-                    self.col = 0
-
                 self._increment()
 
             if self.curr != "#":
@@ -102,7 +99,7 @@ class Tokenizer(object):
         """
 
         t_type = tok.NUMBER
-        col = self.col
+        pos = self.base + self.index
 
         num = ''
 
@@ -110,14 +107,14 @@ class Tokenizer(object):
             num += self._increment()
 
         if self.curr != ".":
-            return Token(t_type, int(num), self.line, col)
+            return Token(t_type, int(num), pos)
 
         num += self._increment()
 
         while self.curr and self.curr.isdigit():
             num += self._increment()
 
-        return Token(t_type, float(num), self.line, col)
+        return Token(t_type, float(num), pos)
 
     def _name_token(self) -> Token:
         """
@@ -127,7 +124,7 @@ class Tokenizer(object):
         """
 
         t_type = tok.ID
-        col = self.col
+        pos = self.base + self.index
 
         id = ''
 
@@ -135,9 +132,9 @@ class Tokenizer(object):
             id += self._increment()
 
         if id in self.keywords:
-            return Token(id, id, self.line, col)
+            return Token(id, id, pos)
 
-        return Token(tok.ID, id, self.line, col)
+        return Token(tok.ID, id, pos)
 
     def _string_token(self) -> Token:
         """
@@ -145,13 +142,16 @@ class Tokenizer(object):
         """
 
         t_type = tok.STRING
-        col = self.col
+        pos = self.base + self.index
 
         string = ''
 
         prev = self._increment()
 
         while self.curr != "'" or (prev == "\\" and self.curr == "'"):
+            if not self.curr:
+                error("Unterminated string", pos)
+
             string += self.curr
             prev = self._increment()
 
@@ -161,7 +161,7 @@ class Tokenizer(object):
         decoded_string = codecs.escape_decode(
             bytes(string, "utf-8"))[0].decode("utf-8")
 
-        return Token(t_type, decoded_string, self.line, col)
+        return Token(t_type, decoded_string, pos)
 
     def peek(self) -> str:
         """
@@ -186,10 +186,10 @@ class Tokenizer(object):
         self._skip()
 
         char = self.curr
-        col = self.col
+        pos = self.base + self.index
 
         if not char:
-            return Token(tok.EOF, None, self.line, col)
+            return Token(tok.EOF, None, pos)
 
         elif char == '\'':
             return self._string_token()
@@ -200,7 +200,7 @@ class Tokenizer(object):
         elif char.isalpha() or char == '_':
             return self._name_token()
 
-        poss_tok = char + self._next()
+        poss_tok = char + (self._next() or '')
 
         if poss_tok in tok.reserved_double_char:
             char = poss_tok
@@ -208,9 +208,9 @@ class Tokenizer(object):
 
         elif char not in tok.reserved_single_char:
             # If there is not a one char identifier at this point, bad char.
-            error(f"Invalid character: {char}", (self.line, col))
+            error(f"Invalid character: {char}", pos)
 
         self._increment()
-        token = Token(char, char, self.line, col)
+        token = Token(char, char, pos)
 
         return token
@@ -1,7 +1,9 @@
 from typing import Any
 
-from lang.tokenizer import Token
-from lang.error import error
+from lang.error import error, where
+from lang.array import FlatArray, SharedArray, SparseArray
+from lang.task import Task
+from lang.stream import File
 
 import lang.token as tok
 
@@ -11,89 +13,101 @@ _type_switch = {
     bool       : tok.BOOL,
     str        : tok.STR,
     list       : tok.ARR,
+    FlatArray  : tok.ARR,
+    SharedArray: tok.ARR,
+    SparseArray: tok.ARR,
+    Task       : tok.TASK,
+    File       : tok.FILE,
     type(None) : tok.NIL
 }
 
-_op_switch = {
-    tok.NUM    : (tok.ADD, tok.SUB, tok.MUL, tok.DIV, tok.MOD, tok.I_DIV,
-                  tok.EQ, tok.NEQ, tok.GEQ, tok.LEQ, tok.GREATER, tok.LESS),
-    tok.BOOL   : (tok.AND, tok.OR, tok.NOT, tok.EQ, tok.NEQ),
-    tok.STR    : (tok.ADD, tok.EQ, tok.NEQ),
-    tok.NIL    : (tok.EQ, tok.NEQ),
-    tok.ARR    : (tok.EQ, tok.NEQ)
-}
+
+def type_name(value: Any) -> str:
+    """
+    Returns the name of the cou type of a value
+    """
+
+    return _type_switch[type(value)]
 
 
-def validate_array_index(token: Token, index: Any, arr: Any):
+def is_array(value: Any) -> bool:
+    """
+    Returns true if a value is a cou array
+    """
+
+    return _type_switch.get(type(value)) == tok.ARR
+
+
+def validate_array_index(pos: int, index: Any, arr: Any):
     """
     Validates an array index
     """
 
     arr_c_type = _type_switch[type(arr)]
     if type(index) != int:
-        error(f"Array index must be an integer value", token)
+        error(f"Array index must be an integer value", pos)
 
-    elif type(arr) != list:
-        error(f"Type '{arr_c_type}' not indexed", token)
+    elif arr_c_type != tok.ARR:
+        error(f"Type '{arr_c_type}' not indexed", pos)
 
     elif len(arr) <= index:
-        raise IndexError(f"Array index out of range <line:{token.line},col:{token.col}>")
+        line, col = where(pos)
+        raise IndexError(f"Array index out of range <line:{line},col:{col}>")
 
 
-def validate_array_size(token: Token, asn: Any):
+def validate_array_size(pos: int, asn: Any):
     """
     Validates an array assignment
     """
 
     if type(asn) != int:
-        error(f"Array size must be an integer value", token)
+        error(f"Array size must be an integer value", pos)
 
 
-def validate_condition(token: Token, asn: Any):
+def validate_condition(pos: int, asn: Any):
     """
     Validates a cou type given given a function return type
     """
 
     asn_c_type = _type_switch[type(asn)]
     if tok.BOOL != asn_c_type:
-        error(f"Condition cannot be \'{asn_c_type}\', must evaluate to 'bool'", token)
+        error(f"Condition cannot be \'{asn_c_type}\', must evaluate to 'bool'", pos)
 
-def validate_return(cou_type: str, token: Token, asn: Any):
+def validate_return(cou_type: str, pos: int, asn: Any):
     """
     Validates a cou type given given a function return type
     """
 
     asn_c_type = _type_switch[type(asn)]
     if cou_type != asn_c_type:
-        error(f"Incompatible type \'{asn_c_type}\' for return type \'{cou_type}\'", token)
+        error(f"Incompatible type \'{asn_c_type}\' for return type \'{cou_type}\'", pos)
 
 
-def validate_type(cou_type: str, token: Token, asn: Any):
+def validate_argument(cou_type: str, pos: int, name: str, arg: Any):
     """
-    Validates a cou type given an assignment
+    Validates an argument given the type of a builtin's parameter
     """
 
-    asn_c_type = _type_switch[type(asn)]
-    if cou_type != asn_c_type:
-        error(f"Cannot assign \'{asn_c_type}\' to \'{cou_type}\'", token)
+    arg_c_type = _type_switch[type(arg)]
+    if cou_type != arg_c_type:
+        error(f"Argument '{name}' cannot be '{arg_c_type}', must be '{cou_type}'", pos)
+
 
-def validate_operation(op_type: str, token: Token, op1: Any, op2: Any = None):
+def validate_task(pos: int, asn: Any):
     """
-    Validates a cou type given an operation
+    Validates that a value can be awaited
     """
 
-    c_type_1 = _type_switch[type(op1)]
-
-    if op2:
-
-        c_type_2 = _type_switch[type(op2)]
+    asn_c_type = _type_switch[type(asn)]
+    if asn_c_type != tok.TASK:
+        error(f"Cannot await '{asn_c_type}', must be a 'task'", pos)
 
-        if (c_type_1 == tok.STR or c_type_2 == tok.STR) and op_type == tok.ADD:
-            return # Here an automatic string conversion will happen, so this is ok
 
-        if c_type_1 != c_type_2 or op_type not in _op_switch[c_type_1]:
-            error(f"Invalid operation {op_type} between types '{c_type_1}' and '{c_type_2}'", token)
+def validate_type(cou_type: str, pos: int, asn: Any):
+    """
+    Validates a cou type given an assignment
+    """
 
-    else:
-        if op_type not in _op_switch[c_type_1]:
-            error(f"Invalid operation {op_type} for type '{c_type_1}'", token)
+    asn_c_type = _type_switch[type(asn)]
+    if cou_type != asn_c_type:
+        error(f"Cannot assign \'{asn_c_type}\' to \'{cou_type}\'", pos)
@@ -0,0 +1,62 @@
+# The incremental parser cannot be reached from a cou program, so it is
+# tested from python. Run with python -m pytest test/test_incremental.py
+
+import unittest
+
+from lang.incremental import IncrementalParser
+from lang.parser import Parser
+from lang.tokenizer import Tokenizer
+from lang.error import where
+from lang.ast import walk
+
+
+def positions(program):
+    """
+    Returns the line and column of every node of a program
+    """
+
+    return [(type(node).__name__, where(node.pos))
+            for statement in program.statements for node in walk(statement)
+            if type(getattr(node, "pos", None)) == int]
+
+
+class TestFailedUpdate(unittest.TestCase):
+
+    def setUp(self):
+        with open("test/tasks.cou") as source:
+            self.lines = source.read().split("\n")
+
+        self.parser = IncrementalParser()
+        self.parser.update("\n".join(self.lines))
+
+    def test_positions_survive_failed_update(self):
+        broken = self.lines[:26] + ["}"] + self.lines[26:]
+
+        with self.assertRaises(SyntaxError):
+            self.parser.update("\n".join(broken))
+
+        del broken[2]
+
+        with self.assertRaises(SyntaxError):
+            self.parser.update("\n".join(broken))
+
+        text = "\n".join(self.lines[:2] + self.lines[3:])
+
+        self.assertEqual(positions(self.parser.update(text)),
+                         positions(Parser(Tokenizer(text)).parse()))
+
+    def test_process_kept_after_failed_update(self):
+        add = self.parser.symtab.get_global("add")
+        process = add.process
+
+        text = "\n".join(self.lines)
+        edited = text.replace("total = total + n;", "total = total + n * 2;") + "\n}"
+
+        with self.assertRaises(SyntaxError):
+            self.parser.update(edited)
+
+        self.assertIs(add.process, process)
+
+
+if __name__ == "__main__":
+    unittest.main()